@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from embed_cache import normalize_text
+
+# ----- CONFIG -----
+THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+class SemanticAnswerCache:
+    """In-memory cache of answers, looked up by question embedding.
+
+    A question hits when its normalized text was asked before, or when its
+    embedding has cosine similarity >= ``threshold`` with a cached question.
+    Entries expire after ``ttl`` seconds; beyond ``max_entries`` the least
+    recently used entry is dropped. When ``generation`` (a callable returning
+    the vector store's current generation) changes, the whole cache is cleared
+    so answers never outlive the index they were built from.
+    """
+
+    def __init__(self, threshold=THRESHOLD, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES,
+                 generation=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = generation
+        self._generation = generation() if generation else None
+        self._entries = OrderedDict()  # normalized question -> entry, LRU first
+        self._matrix = None  # unit vectors of the entries, rebuilt lazily
+        self._keys = []
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+
+    def _check_generation(self):
+        if self.generation is None:
+            return
+        current = self.generation()
+        if current != self._generation:
+            self._generation = current
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def _expire(self, now):
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+    def _similar(self, vector):
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = (np.array([self._entries[k]["vector"] for k in self._keys])
+                            if self._keys else None)
+        if self._matrix is None:
+            return None
+        sims = self._matrix @ vector
+        best = int(np.argmax(sims))
+        if sims[best] >= self.threshold:
+            return self._keys[best]
+        return None
+
+    def lookup(self, question, vector):
+        """Return the cached entry dict for ``question`` or None."""
+        key = normalize_text(question).lower()
+        with self._lock:
+            self._check_generation()
+            self._expire(time.time())
+
+            if key in self._entries:
+                self.exact_hits += 1
+            else:
+                key = self._similar(_unit(vector))
+                if key is None:
+                    self.misses += 1
+                    return None
+                self.semantic_hits += 1
+
+            self._entries.move_to_end(key)
+            entry = self._entries[key]
+            self.seconds_saved += entry["seconds"]
+            return entry
+
+    def store(self, question, vector, answer, sources, seconds=0.0):
+        """Cache an answer; ``seconds`` is what producing it cost, for the saved-time counter."""
+        key = normalize_text(question).lower()
+        with self._lock:
+            self._check_generation()
+            self._entries[key] = {
+                "answer": answer,
+                "sources": sources,
+                "vector": _unit(vector),
+                "created": time.time(),
+                "seconds": seconds,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "llm_seconds_saved": round(self.seconds_saved, 3),
+            }
+
+
+def _unit(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
@@ -1,64 +1,391 @@
-from fastapi import FastAPI
+import os
+import json
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+_import_start = time.perf_counter()
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-
-app = FastAPI()
-
-# Load vector DB and set up retriever
-embedding_fn = OllamaEmbeddings(model="nomic-embed-text:latest")
-vectordb = Chroma(
-    persist_directory="vectordb",
-    embedding_function=embedding_fn
-)
-
-retriever = vectordb.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 4}
-)
-
-# LLM
-llm = ChatOllama(
-    model="llama3.2:1b",
-    temperature=0.0
-)
-
-prompt = PromptTemplate.from_template(
-    "Use the following context to answer the question. "
-    "If the answer is not in the context, say 'I don’t know.'\n\n"
-    "Context:\n{context}\n\n"
-    "Question: {question}"
-)
-
-qa = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",
-    retriever=retriever,
-    return_source_documents=True,
-    chain_type_kwargs={"prompt": prompt}
-)
+from microbatch import MicroBatcher
+from context_packing import pack_context, token_counter
+from rag_metrics import REGISTRY, REQUESTS, Timings
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+EMBED_MODEL = "nomic-embed-text:latest"
+LLM_MODEL = "llama3.2:1b"
+# Seconds Ollama keeps both models loaded after a request
+KEEP_ALIVE = int(os.getenv("RAG_KEEP_ALIVE", "1800"))
+# Load the models into Ollama at startup so the first question doesn't pay for it
+PREWARM = os.getenv("RAG_PREWARM", "1") == "1"
+# Coalesce concurrent questions into one embedding call and one vector query
+USE_MICROBATCH = os.getenv("RAG_MICROBATCH", "0") == "1"
+# "chroma", or "numpy" for the memory-mapped snapshot published by embeddings.py
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma")
+# Set by serve.py; with several worker processes the embedding cache is opened read-only
+WORKERS = int(os.getenv("RAG_WORKERS", "1"))
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "index")
+INDEX_MODE = os.getenv("RAG_INDEX_MODE", "exact")  # or "ivf"
+# "vector", or "hybrid" to fuse vector search with the BM25 index by reciprocal rank
+RETRIEVAL = os.getenv("RAG_RETRIEVAL", "vector")
+BM25_DIR = os.getenv("RAG_BM25_DIR", "bm25")
+# Stitch overlapping chunks and cap the context at RAG_CONTEXT_TOKENS; 0 stuffs chunks as-is
+PACK_CONTEXT = os.getenv("RAG_CONTEXT_PACKING", "1") == "1"
+# Over-fetch RAG_RERANK_FETCH candidates and re-rank them down to TOP_K
+USE_RERANK = os.getenv("RAG_RERANK", "0") == "1"
+TOP_K = 4
+
+# Built by load_components() when the app starts, not at import time
+embedding_fn = None
+vectordb = None
+retriever = None
+answer_cache = None
+llm = None
+prompt = None
+embed_batcher = None
+search_batcher = None
+reranker = None
+
+startup = {"ready": False}
+
+
+def load_components():
+    """Import the LangChain stack and build the retriever, caches and LLM client."""
+    global embedding_fn, vectordb, retriever, answer_cache, llm, prompt
+    global embed_batcher, search_batcher, reranker
+
+    from langchain_ollama import ChatOllama, OllamaEmbeddings
+    from langchain_core.prompts import PromptTemplate
+    from embed_cache import CachedEmbeddings, EmbeddingCache
+    from answer_cache import SemanticAnswerCache
+    from embeddings import read_generation
+
+    # Load vector DB and set up retriever; repeated questions reuse cached embeddings
+    embedding_fn = CachedEmbeddings(
+        OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_URL, keep_alive=KEEP_ALIVE),
+        EmbeddingCache(EMBED_MODEL, read_only=WORKERS > 1)
+    )
+    if RAG_BACKEND == "numpy":
+        # Follows the snapshot pointer, so embeddings.py can publish without a restart
+        from vector_index import SnapshotIndex
+        vectordb = SnapshotIndex(INDEX_DIR, embedding_fn, mode=INDEX_MODE)
+    else:
+        from langchain_community.vectorstores import Chroma
+        vectordb = Chroma(
+            persist_directory="vectordb",
+            embedding_function=embedding_fn
+        )
+
+    candidates = TOP_K
+    if USE_RERANK:
+        from rerank import FETCH_N, Reranker
+        reranker = Reranker()
+        candidates = max(TOP_K, FETCH_N)
+
+    if RETRIEVAL == "hybrid":
+        from bm25_index import FETCH_K, BM25Index, HybridRetriever
+        retriever = HybridRetriever(vectorstore=vectordb, index=BM25Index(BM25_DIR),
+                                    k=candidates, fetch_k=max(FETCH_K, candidates))
+    else:
+        retriever = vectordb.as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": candidates}
+        )
+
+    # Answers to (near-)identical questions; cleared whenever embeddings.py
+    # publishes a new generation of the vector store
+    answer_cache = SemanticAnswerCache(generation=lambda: read_generation("vectordb"))
+
+    # LLM
+    llm = ChatOllama(
+        model=LLM_MODEL,
+        base_url=OLLAMA_URL,
+        temperature=0.0,
+        keep_alive=KEEP_ALIVE
+    )
+
+    prompt = PromptTemplate.from_template(
+        "Use the following context to answer the question. "
+        "If the answer is not in the context, say 'I don’t know.'\n\n"
+        "Context:\n{context}\n\n"
+        "Question: {question}"
+    )
+
+    if PACK_CONTEXT:
+        token_counter()  # loads the tiktoken encoding
+
+    embed_batcher = MicroBatcher(embedding_fn.embed_documents)
+    if RETRIEVAL == "hybrid":
+        search_batcher = MicroBatcher(lambda vectors: search_by_vectors(vectors, retriever.fetch_k))
+    else:
+        search_batcher = MicroBatcher(lambda vectors: search_by_vectors(vectors, candidates))
+
+
+async def prewarm():
+    """Load both models into Ollama (an empty generate request loads the LLM
+    without generating) and keep them resident for KEEP_ALIVE."""
+    timings = {}
+    async with httpx.AsyncClient(base_url=OLLAMA_URL, timeout=300) as http:
+        for name, path, body in (
+            ("embed", "/api/embed", {"model": EMBED_MODEL, "input": "warm up"}),
+            ("llm", "/api/generate", {"model": LLM_MODEL, "prompt": "", "stream": False}),
+        ):
+            start = time.perf_counter()
+            resp = await http.post(path, json={**body, "keep_alive": KEEP_ALIVE})
+            resp.raise_for_status()
+            timings[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+async def warm_up():
+    start = time.perf_counter()
+    try:
+        await run_in_threadpool(load_components)
+    except Exception as e:
+        # Stay up but never ready, so /ready shows why
+        startup["error"] = f"{type(e).__name__}: {e}"
+        print("Startup failed:", startup["error"])
+        return
+    startup["load_seconds"] = round(time.perf_counter() - start, 3)
+    if PREWARM:
+        try:
+            startup["prewarm"] = await prewarm()
+        except httpx.HTTPError as e:
+            # Still serve; the first request will load the models instead
+            startup["prewarm"] = {"error": str(e)}
+    startup["startup_seconds"] = round(time.perf_counter() - start, 3)
+    startup["ready"] = True
+    print("Startup:", startup)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # uvicorn only accepts connections once the lifespan startup is done, so
+    # loading runs in the background: until it finishes, /ready and every
+    # endpoint answer 503 instead of the server refusing connections
+    task = asyncio.create_task(warm_up())
+    yield
+    task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def require_ready():
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="Service is starting")
 
 
 class QueryIn(BaseModel):
     question: str
 
 
-@app.post("/ask")
-def ask(q: QueryIn):
-    result = qa({"query": q.question})
+def build_prompt(question, docs, timings):
+    with timings.span("prompt_build"):
+        if PACK_CONTEXT:
+            context, stats = pack_context(docs)
+            timings.count("context", stats["tokens_packed"])
+        else:
+            # Same "stuff" layout RetrievalQA used: chunks joined by blank lines
+            context = "\n\n".join(doc.page_content for doc in docs)
+            timings.count("context", token_counter().count(context))
+        return prompt.format(context=context, question=question)
+
 
+def count_llm_tokens(timings, usage):
+    # Ollama's prompt_eval_count / eval_count, as reported by ChatOllama
+    if usage:
+        timings.count("prompt", usage.get("input_tokens"))
+        timings.count("completion", usage.get("output_tokens"))
+
+
+def format_sources(docs):
     # Prepare sources with page info
     sources = []
-    for doc in result.get("source_documents", []):
+    for doc in docs:
         # Assuming metadata contains 'page' or 'page_number'
         page = doc.metadata.get("page", "unknown")
-        sources.append({"page": page, "content": doc.page_content[:200]})  # truncate for preview
+        source = {"page": page, "content": doc.page_content[:200]}  # truncate for preview
+        # Layout chunks (ingest.py --chunking layout) know their section and last page
+        if doc.metadata.get("section"):
+            source["section"] = doc.metadata["section"]
+        if doc.metadata.get("page_end", page) != page:
+            source["page_end"] = doc.metadata["page_end"]
+        sources.append(source)
+    return sources
+
+
+def search_by_vectors(vectors, k=4):
+    """Top-k documents for each of several question embeddings, in one query."""
+    if RAG_BACKEND == "numpy":
+        return vectordb.search_by_vectors(vectors, k)
+    from langchain_core.documents import Document
+    results = vectordb._collection.query(
+        query_embeddings=vectors,
+        n_results=k,
+        include=["documents", "metadatas"]
+    )
+    return [
+        [Document(page_content=text, metadata=metadata or {})
+         for text, metadata in zip(texts, metadatas)]
+        for texts, metadatas in zip(results["documents"], results["metadatas"])
+    ]
 
+
+def search_by_vector(question, question_vector):
+    """The retriever's results for an already embedded question, so a request
+    embeds its question once even when the embedding cache is read-only or off."""
+    if RETRIEVAL == "hybrid":
+        vector_docs = vectordb.similarity_search_by_vector(question_vector, k=retriever.fetch_k)
+        return retriever.fuse(question, vector_docs)
+    k = retriever.search_kwargs["k"]
+    if RAG_BACKEND == "numpy":
+        return vectordb.search_by_vectors([question_vector], k)[0]
+    return vectordb.similarity_search_by_vector(question_vector, k=k)
+
+
+async def embed_question(question, timings):
+    with timings.span("embed"):
+        if USE_MICROBATCH:
+            return await embed_batcher.submit(question)
+        return await run_in_threadpool(embedding_fn.embed_query, question)
+
+
+async def retrieve(question, question_vector, timings):
+    with timings.span("retrieve"):
+        if USE_MICROBATCH:
+            docs = await search_batcher.submit(question_vector)
+            if RETRIEVAL == "hybrid":
+                docs = await run_in_threadpool(retriever.fuse, question, docs)
+        else:
+            docs = await run_in_threadpool(search_by_vector, question, question_vector)
+    if reranker is not None:
+        with timings.span("rerank"):
+            docs = await run_in_threadpool(reranker.rerank, question, docs, TOP_K)
+    return docs
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask")
+async def ask(q: QueryIn):
+    require_ready()
+    timings = Timings()
+    question_vector = await embed_question(q.question, timings)
+    cached = answer_cache.lookup(q.question, question_vector)
+    if cached:
+        REQUESTS.inc(endpoint="/ask", cached="true")
+        return {"ans": cached["answer"], "sources": cached["sources"], "cached": True,
+                "timings": timings.finish()}
+
+    docs = await retrieve(q.question, question_vector, timings)
+    prompt_text = build_prompt(q.question, docs, timings)
+    with timings.span("generate"):
+        answer = await llm.ainvoke(prompt_text)
+    count_llm_tokens(timings, answer.usage_metadata)
+    sources = format_sources(docs)
+    answer_cache.store(q.question, question_vector, answer.content, sources,
+                       seconds=time.perf_counter() - timings.start)
+    REQUESTS.inc(endpoint="/ask", cached="false")
+
+    return {
+        "ans": answer.content,      # frontend expects 'ans'
+        "sources": sources,
+        "cached": False,
+        "timings": timings.finish()
+    }
+
+
+@app.post("/ask/stream")
+async def ask_stream(q: QueryIn):
+    """Server-sent events: one `sources` event as soon as retrieval is done,
+    then a `token` event per generated chunk, then `done` (with the timings)
+    or `error`."""
+    require_ready()
+
+    async def events():
+        try:
+            timings = Timings()
+            question_vector = await embed_question(q.question, timings)
+            cached = answer_cache.lookup(q.question, question_vector)
+            if cached:
+                yield sse("sources", cached["sources"])
+                yield sse("token", cached["answer"])
+                REQUESTS.inc(endpoint="/ask/stream", cached="true")
+                yield sse("done", {"cached": True, "timings": timings.finish()})
+                return
+
+            docs = await retrieve(q.question, question_vector, timings)
+            sources = format_sources(docs)
+            yield sse("sources", sources)
+
+            answer = ""
+            prompt_text = build_prompt(q.question, docs, timings)
+            generate_start = time.perf_counter()
+            async for chunk in llm.astream(prompt_text):
+                if chunk.content:
+                    if not answer:
+                        timings.mark("first_token")
+                    answer += chunk.content
+                    yield sse("token", chunk.content)
+                count_llm_tokens(timings, chunk.usage_metadata)
+            timings.add("generate", time.perf_counter() - generate_start)
+            answer_cache.store(q.question, question_vector, answer, sources,
+                               seconds=time.perf_counter() - timings.start)
+            REQUESTS.inc(endpoint="/ask/stream", cached="false")
+            yield sse("done", {"cached": False, "timings": timings.finish()})
+        except Exception as e:
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    require_ready()
+    return {
+        "answers": answer_cache.stats(),
+        "embeddings": embedding_fn.cache.stats()
+    }
+
+
+@app.get("/batching/stats")
+def batching_stats():
+    require_ready()
     return {
-        "ans": result["result"],      # frontend expects 'ans'
-        "sources": sources
+        "enabled": USE_MICROBATCH,
+        "embed": embed_batcher.stats(),
+        "search": search_batcher.stats()
     }
 
 
+@app.get("/rerank/stats")
+def rerank_stats():
+    require_ready()
+    return {"enabled": USE_RERANK, **(reranker.stats() if reranker else {})}
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: stage latency histograms, token and request counters."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready")
+def ready():
+    """200 with startup timings once the models are loaded, 503 before."""
+    return JSONResponse(startup, status_code=200 if startup["ready"] else 503)
+
+
+# Time to import this module; the heavy imports happen in load_components()
+startup["import_seconds"] = round(time.perf_counter() - _import_start, 3)
@@ -0,0 +1,113 @@
+"""Tokens saved by context packing, per query.
+
+Retrieves the top-k chunks for a set of questions exactly as app.py does
+and compares the plain "stuff" context (chunks joined by blank lines) with
+the packed one. With --llm each prompt is also sent to the model once and
+Ollama's prompt evaluation (prefill) time is compared.
+
+    python bench_context.py --queries 100 --budget 768
+    python bench_context.py --questions questions.txt --llm
+"""
+import json
+import time
+import random
+import argparse
+import statistics
+
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_community.vectorstores import Chroma
+
+from embeddings import CHUNKS_DIR, PERSIST_DIR, MODEL_NAME, OLLAMA_URL, iter_documents
+from embed_cache import CachedEmbeddings, EmbeddingCache
+from context_packing import CONTEXT_TOKEN_BUDGET, pack_context, token_counter
+
+PROMPT = ("Use the following context to answer the question. "
+          "If the answer is not in the context, say 'I don’t know.'\n\n"
+          "Context:\n{context}\n\n"
+          "Question: {question}")
+
+
+def sample_questions(chunks_dir, n, words, seed):
+    """Pseudo-questions: the first words of randomly chosen chunks."""
+    texts = [" ".join(doc["page_content"].split()[:words]) for doc in iter_documents(chunks_dir)]
+    random.Random(seed).shuffle(texts)
+    return texts[:n]
+
+
+def prefill_ms(llm, prompt):
+    response = llm.invoke(prompt)
+    # Ollama reports durations in nanoseconds
+    return (response.response_metadata.get("prompt_eval_duration") or 0) / 1e6
+
+
+def summary(values):
+    values = sorted(values)
+    return {
+        "mean": statistics.mean(values),
+        "p50": statistics.median(values),
+        "p95": values[int(0.95 * (len(values) - 1))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark context packing.")
+    parser.add_argument("--persist-dir", default=PERSIST_DIR)
+    parser.add_argument("--chunks-dir", default=CHUNKS_DIR)
+    parser.add_argument("--questions", help="File with one question per line.")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm", action="store_true",
+                        help="Also measure prompt evaluation time on the model.")
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()][:args.queries]
+    else:
+        questions = sample_questions(args.chunks_dir, args.queries, args.query_words, args.seed)
+
+    embedder = CachedEmbeddings(OllamaEmbeddings(model=MODEL_NAME, base_url=OLLAMA_URL),
+                                EmbeddingCache(MODEL_NAME))
+    vectordb = Chroma(persist_directory=args.persist_dir, embedding_function=embedder)
+    counter = token_counter()
+    llm = ChatOllama(model="llama3.2:1b", base_url=OLLAMA_URL, temperature=0.0) if args.llm else None
+
+    rows = []
+    for question in questions:
+        docs = vectordb.similarity_search(question, k=args.k)
+        start = time.perf_counter()
+        context, stats = pack_context(docs, budget=args.budget, counter=counter)
+        stats["pack_ms"] = 1000 * (time.perf_counter() - start)
+        # Compared with plain concatenation, the "stuff" context without packing
+        stuffed = "\n\n".join(doc.page_content for doc in docs)
+        stats["tokens_stuffed"] = counter.count(stuffed)
+        stats["tokens_saved"] = stats["tokens_stuffed"] - stats["tokens_packed"]
+        if llm is not None:
+            stats["prefill_ms_stuffed"] = prefill_ms(llm, PROMPT.format(context=stuffed, question=question))
+            stats["prefill_ms_packed"] = prefill_ms(llm, PROMPT.format(context=context, question=question))
+        rows.append(stats)
+
+    report = {key: summary([row[key] for row in rows]) for key in rows[0] if key != "chunks"}
+    stuffed_total = sum(row["tokens_stuffed"] for row in rows)
+    report["saved_fraction"] = (sum(row["tokens_saved"] for row in rows) / stuffed_total
+                                if stuffed_total else 0.0)
+
+    print(f"{len(rows)} queries, k={args.k}, budget={args.budget} tokens")
+    for key, values in report.items():
+        if isinstance(values, dict):
+            print(f"  {key:<20} mean {values['mean']:8.1f}  p50 {values['p50']:8.1f}  "
+                  f"p95 {values['p95']:8.1f}")
+    print(f"  tokens saved: {100 * report['saved_fraction']:.1f}% of the stuffed context")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"queries": len(rows), "k": args.k, "budget": args.budget,
+                       "summary": report, "per_query": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Load-test harness for the FastAPI RAG service.
+
+Fires a fixed number of distinct questions at /ask with 1, 8, 32 and 128
+concurrent clients and reports throughput and latency percentiles.
+
+    # against an already running server
+    python bench_load.py --url http://localhost:8000
+
+    # start the app twice (micro-batching off, then on) and compare
+    python bench_load.py --spawn --ollama-url http://127.0.0.1:11435
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+from rag_metrics import percentile
+
+QUESTIONS = [
+    "What is the projected global mean sea level rise under SSP5-8.5?",
+    "How much has global surface temperature increased since pre-industrial times?",
+    "What are the main drivers of observed warming?",
+    "What is the remaining carbon budget for limiting warming to 1.5°C?",
+    "How will extreme heat events change with further warming?",
+    "What adaptation options reduce climate risks for coastal cities?",
+    "How does ocean acidification affect marine ecosystems?",
+    "What is the role of methane in near-term warming?",
+]
+
+
+async def run_level(url, path, concurrency, n_requests, timeout):
+    latencies = []
+    errors = 0
+    counter = iter(range(n_requests))
+
+    async def client(http):
+        nonlocal errors
+        for i in counter:
+            # A unique suffix keeps the answer and embedding caches out of the measurement
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} (load test request {i})"
+            start = time.perf_counter()
+            try:
+                resp = await http.post(url + path, json={"question": question})
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 1000 * statistics.median(latencies) if latencies else None,
+        "p95_ms": 1000 * percentile(latencies, 0.95) if latencies else None,
+    }
+
+
+async def run_all(url, path, levels, n_requests, timeout):
+    results = []
+    for concurrency in levels:
+        result = await run_level(url, path, concurrency, max(n_requests, concurrency), timeout)
+        print(f"  c={concurrency:<4} {result['throughput_rps']:8.1f} req/s  "
+              f"p50 {result['p50_ms'] or 0:8.1f} ms  p95 {result['p95_ms'] or 0:8.1f} ms  "
+              f"errors {result['errors']}")
+        results.append(result)
+    return results
+
+
+def spawn_app(port, env):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("app did not start within 120s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the /ask endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/ask")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=256,
+                        help="Requests per concurrency level (at least one per client).")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start the app with RAG_MICROBATCH=0 and =1 and compare.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    if not args.spawn:
+        print(f"Load test {args.url}{args.path}")
+        report = asyncio.run(run_all(args.url, args.path, args.concurrency, args.requests, args.timeout))
+    else:
+        report = {}
+        for mode in ("0", "1"):
+            env = {"RAG_MICROBATCH": mode, "OLLAMA_URL": args.ollama_url,
+                   "ANSWER_CACHE_MAX_ENTRIES": "0"}
+            print(f"RAG_MICROBATCH={mode}")
+            proc = spawn_app(args.port, env)
+            try:
+                url = f"http://127.0.0.1:{args.port}"
+                report[f"microbatch={mode}"] = asyncio.run(
+                    run_all(url, args.path, args.concurrency, args.requests, args.timeout))
+            finally:
+                proc.terminate()
+                proc.wait()
+
+        print("Throughput gain from micro-batching:")
+        for off, on in zip(report["microbatch=0"], report["microbatch=1"]):
+            gain = on["throughput_rps"] / off["throughput_rps"] if off["throughput_rps"] else 0.0
+            print(f"  c={off['concurrency']:<4} x{gain:.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Offline end-to-end benchmark: ingest, index build, retrieval speed and quality.
+
+Runs the real pipeline in a scratch directory: ingest.py over the PDFs,
+embeddings.py into a fresh store (and NumPy snapshot / BM25 index), then
+every question of a fixed question set through the same steps as POST /ask
+(embedding, retrieval and re-ranking as configured by the usual RAG_*
+variables, prompt building, generation by the LLM; ``--stub`` serves both
+models from stub_ollama.py). Reports ingest throughput, index build time,
+retrieval and end-to-end latency percentiles, recall@k and MRR against the
+gold pages, and writes JSON that ``--compare`` diffs between runs.
+
+A question file is JSONL, one ``{"question", "gold": [{"source", "page"}]}``
+per line; ``source`` is the PDF file name and ``page`` the 0-based page
+index stored in chunk metadata. Instead of ``gold``, a question can list
+``evidence``: short verbatim spans of the report that answer it. Its gold
+pages are then every page of the corpus containing one of them (compared
+as lowercase words), and questions whose evidence isn't in the corpus are
+skipped and counted.
+
+bench/questions.jsonl is the fixed set: hand-written questions about the
+IPCC AR6 Summaries for Policymakers, worded differently from the reports,
+each with hand-picked evidence. ``--make-questions`` derives a set from
+the corpus instead, but its questions are verbatim passages of chunks, so
+its recall measures exact lexical lookup (which favors BM25 and hybrid
+retrieval) and it is only a smoke test.
+
+    python bench_rag.py --stub --out run_a.json
+    RAG_RETRIEVAL=hybrid python bench_rag.py --stub --out run_b.json
+    python bench_rag.py --compare run_a.json run_b.json
+    python bench_rag.py --make-questions generated.jsonl --n 100
+"""
+import os
+import sys
+import glob
+import re
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+
+import pypdf
+
+from rag_metrics import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_GLOB = "data/*.pdf"
+QUESTIONS = os.path.join(HERE, "bench", "questions.jsonl")
+SENTENCE_WORDS = (10, 16)  # Length of generated question passages
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def latency_summary(seconds):
+    return {
+        "p50_ms": 1000 * statistics.median(seconds),
+        "p95_ms": 1000 * percentile(seconds, 0.95),
+        "p99_ms": 1000 * percentile(seconds, 0.99),
+        "mean_ms": 1000 * statistics.mean(seconds),
+    }
+
+
+# ----- QUESTION SET -----
+def make_questions(chunks_dir, n, seed):
+    """Questions taken verbatim from random chunks, with every page containing them as gold."""
+    from chunk_store import iter_chunks
+
+    chunks = [(os.path.basename(c["metadata"].get("source", "")), c["metadata"].get("page"),
+               " ".join(c["page_content"].split())) for c in iter_chunks(chunks_dir)]
+    rng = random.Random(seed)
+    questions = []
+    seen = set()
+    for _ in range(20 * n):
+        if len(questions) >= n:
+            break
+        _, _, text = rng.choice(chunks)
+        words = text.split()
+        length = rng.randint(*SENTENCE_WORDS)
+        if len(words) < length:
+            continue
+        start = rng.randrange(len(words) - length + 1)
+        passage = " ".join(words[start:start + length])
+        if passage in seen:
+            continue
+        seen.add(passage)
+        gold = sorted({(source, page) for source, page, t in chunks if passage in t},
+                      key=lambda g: (g[0], g[1]))
+        questions.append({"question": passage,
+                          "gold": [{"source": s, "page": p} for s, p in gold],
+                          "generated": True})
+    return questions
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def words(text):
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+def resolve_evidence(questions, data_glob):
+    """Give questions labelled by ``evidence`` their gold pages; return them
+    and the number skipped because no page contains their evidence."""
+    if not any("evidence" in q for q in questions):
+        return questions, 0
+    pages = [(os.path.basename(path), i, words(page.extract_text() or ""))
+             for path in sorted(glob.glob(data_glob))
+             for i, page in enumerate(pypdf.PdfReader(path).pages)]
+    resolved = []
+    for q in questions:
+        if "evidence" in q:
+            spans = [words(e) for e in q["evidence"]]
+            gold = [{"source": source, "page": page} for source, page, text in pages
+                    if any(span in text for span in spans)]
+            if not gold:
+                continue
+            q = {**q, "gold": gold}
+        resolved.append(q)
+    return resolved, len(questions) - len(resolved)
+
+
+# ----- STAGES -----
+def start_stub(latency):
+    from stub_ollama import serve
+    server = serve(port=0, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_ingest(data_glob, workers):
+    import ingest
+    pdfs = sorted(glob.glob(data_glob))
+    pages = sum(len(pypdf.PdfReader(p).pages) for p in pdfs)
+    start = time.perf_counter()
+    ingest.main(data_glob=data_glob, chunks_dir="chunks", workers=workers, force=True)
+    seconds = time.perf_counter() - start
+    from chunk_store import iter_chunks
+    chunks = sum(1 for _ in iter_chunks("chunks"))
+    return {"pdfs": len(pdfs), "pages": pages, "chunks": chunks, "seconds": seconds,
+            "pages_per_second": pages / seconds, "chunks_per_second": chunks / seconds}
+
+
+def bench_index(export):
+    import embeddings
+    start = time.perf_counter()
+    embeddings.embed_and_store(incremental=False, index_dir="index" if export else None)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds}
+
+
+async def run_queries(questions, k):
+    import app
+    from rag_metrics import Timings
+
+    app.load_components()
+    retrieval = []
+    end_to_end = []
+    recalls = []
+    reciprocal_ranks = []
+    for q in questions:
+        timings = Timings(histogram=None, tokens=None)
+        start = time.perf_counter()
+        vector = await app.embed_question(q["question"], timings)
+        docs = await app.retrieve(q["question"], vector, timings)
+        retrieval.append(time.perf_counter() - start)
+        prompt_text = app.build_prompt(q["question"], docs, timings)
+        await app.llm.ainvoke(prompt_text)
+        end_to_end.append(time.perf_counter() - start)
+
+        gold = {(g["source"], g["page"]) for g in q["gold"]}
+        # Pages covered by each retrieved chunk (layout chunks may span several)
+        found = [{(os.path.basename(d.metadata.get("source", "")), page)
+                  for page in range(d.metadata.get("page", -1),
+                                    d.metadata.get("page_end", d.metadata.get("page", -1)) + 1)}
+                 for d in docs[:k]]
+        covered = set().union(*found)
+        recalls.append(len(gold & covered) / len(gold) if gold else 0.0)
+        rank = next((i + 1 for i, pages in enumerate(found) if pages & gold), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    return {
+        "questions": len(questions),
+        "k": k,
+        f"recall_at_{k}": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "retrieval": latency_summary(retrieval),
+        "end_to_end": latency_summary(end_to_end),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----- COMPARE -----
+def flatten(report, prefix=""):
+    out = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix + key] = value
+    return out
+
+
+def compare(path_a, path_b):
+    with open(path_a, "r", encoding="utf-8") as f:
+        a = flatten(json.load(f)["results"])
+    with open(path_b, "r", encoding="utf-8") as f:
+        b = flatten(json.load(f)["results"])
+    print(f"{'metric':<34} {'A':>12} {'B':>12} {'change':>9}")
+    for key in sorted(set(a) & set(b)):
+        change = f"{100 * (b[key] - a[key]) / a[key]:+8.1f}%" if a[key] else ""
+        print(f"{key:<34} {a[key]:12.3f} {b[key]:12.3f} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG speed and quality benchmark.")
+    parser.add_argument("--questions", default=QUESTIONS,
+                        help="JSONL question set with gold pages or evidence.")
+    parser.add_argument("--make-questions", metavar="PATH",
+                        help="Derive a question set from the corpus and write it to PATH.")
+    parser.add_argument("--n", type=int, default=100, help="Questions to generate.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-glob", default=DATA_GLOB)
+    parser.add_argument("--workdir", help="Scratch directory (default: a temporary one).")
+    parser.add_argument("--workers", type=int, default=1, help="ingest.py worker processes.")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--stub", action="store_true",
+                        help="Serve embeddings and the LLM from stub_ollama.py (offline runs).")
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", nargs=2, metavar=("A", "B"),
+                        help="Compare two result files instead of running.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    data_glob = os.path.abspath(args.data_glob)
+    questions_path = os.path.abspath(args.questions)
+    out_path = os.path.abspath(args.out) if args.out else None
+    make_path = os.path.abspath(args.make_questions) if args.make_questions else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench_rag_"))
+    os.makedirs(workdir, exist_ok=True)
+    cwd = os.getcwd()
+
+    server = None
+    if args.stub:
+        server, os.environ["OLLAMA_URL"] = start_stub(args.stub_latency)
+    # A fresh embedding cache so the index build really embeds, and no answer cache
+    os.environ["EMBED_CACHE_DIR"] = os.path.join(workdir, ".embed_cache")
+    os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+    os.environ["RAG_METRICS_DIR"] = os.path.join(workdir, "metrics")
+    sys.path.insert(0, HERE)
+    os.chdir(workdir)
+    for path in ("chunks", "vectordb", "index", "bm25"):
+        shutil.rmtree(path, ignore_errors=True)
+
+    try:
+        results = {"ingest": bench_ingest(data_glob, args.workers)}
+        if make_path:
+            questions = make_questions("chunks", args.n, args.seed)
+            os.makedirs(os.path.dirname(make_path), exist_ok=True)
+            with open(make_path, "w", encoding="utf-8") as f:
+                for q in questions:
+                    f.write(json.dumps(q, ensure_ascii=False) + "\n")
+            print(f"Wrote {len(questions)} questions to {make_path}")
+            return
+        questions, skipped = resolve_evidence(load_questions(questions_path), data_glob)
+        if skipped:
+            print(f"{skipped} of {len(questions) + skipped} questions skipped: "
+                  f"their evidence is not in {args.data_glob}")
+        if not questions:
+            raise SystemExit("No question of the set matches the corpus")
+
+        results["index"] = bench_index(export=os.getenv("RAG_BACKEND") == "numpy")
+        results["query"] = asyncio.run(run_queries(questions, args.k))
+        results["query"]["questions_skipped"] = skipped
+    finally:
+        if server is not None:
+            server.shutdown()
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in sorted(os.environ.items())
+                   if key.startswith(("RAG_", "ANSWER_CACHE_"))},
+        "stub": args.stub,
+        "results": results,
+    }
+    print(json.dumps(results, indent=2))
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Recall and latency of the retriever backends against exact search.
+
+Samples chunks from the exported index, embeds the first words of each as
+a query, and runs every query through Chroma, the NumPy index in exact and
+IVF modes, the BM25 index and the hybrid (vector + BM25) retriever. Vector
+backends report recall against exact brute-force search over the same
+vectors, so Chroma's HNSW recall is measured too; every backend reports
+hit@k, how often the chunk the query was taken from comes back.
+
+    python embeddings.py --export-index
+    python bench_retrieval.py --queries 200 --k 4
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+from langchain_ollama import OllamaEmbeddings
+from langchain_community.vectorstores import Chroma
+
+from embeddings import PERSIST_DIR, MODEL_NAME, OLLAMA_URL
+from embed_cache import CachedEmbeddings, EmbeddingCache
+from vector_index import INDEX_DIR, NumpyVectorIndex, current_snapshot
+from bm25_index import BM25_DIR, BM25Index, HybridRetriever, doc_key
+
+
+def sample_queries(index, n, words, seed):
+    """(query text, source chunk id) pairs taken from random chunks."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index.docs), min(n, len(index.docs)), replace=False)
+    records = [index.docs[int(r)] for r in rows]
+    return [(" ".join(r["page_content"].split()[:words]), r["id"]) for r in records]
+
+
+def timed(search, queries, vectors):
+    """Run ``search(text, vector)`` on every query; return (id lists, latencies in ms)."""
+    ids, latencies = [], []
+    for text, v in zip(queries, vectors):
+        start = time.perf_counter()
+        ids.append(search(text, v))
+        latencies.append(1000 * (time.perf_counter() - start))
+    return ids, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retriever backends.")
+    parser.add_argument("--persist-dir", default=PERSIST_DIR)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--bm25-dir", default=BM25_DIR)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    embedder = CachedEmbeddings(OllamaEmbeddings(model=MODEL_NAME, base_url=OLLAMA_URL),
+                                EmbeddingCache(MODEL_NAME))
+    snapshot = current_snapshot(args.index_dir)
+    exact = NumpyVectorIndex(snapshot, embedder, mode="exact")
+    samples = sample_queries(exact, args.queries, args.query_words, args.seed)
+    queries = [text for text, _ in samples]
+    sources = [source for _, source in samples]
+    vectors = embedder.embed_documents(queries)
+    k = args.k
+
+    def numpy_search(index):
+        return lambda text, v: [index.docs[int(r)]["id"] for r in index.search_rows(v, k)[0]]
+
+    chroma = Chroma(persist_directory=args.persist_dir, embedding_function=embedder)
+    backends = {
+        "chroma": lambda text, v: chroma._collection.query(query_embeddings=[v], n_results=k,
+                                                           include=[])["ids"][0],
+        "numpy-exact": numpy_search(exact),
+    }
+    if exact.meta.get("nlist"):
+        for nprobe in args.nprobe:
+            ivf = NumpyVectorIndex(snapshot, embedder, mode="ivf", nprobe=nprobe)
+            backends[f"numpy-ivf-nprobe{nprobe}"] = numpy_search(ivf)
+    lexical = ()
+    if os.path.exists(os.path.join(args.bm25_dir, "segments.json")):
+        bm25 = BM25Index(args.bm25_dir)
+        hybrid = HybridRetriever(vectorstore=chroma, index=bm25, k=k)
+        backends["bm25"] = lambda text, v: [doc.id for doc, _ in bm25.search(text, k)]
+        # Same path as the app: vector search by embedding, then fusion
+        backends["hybrid-chroma"] = lambda text, v: [
+            doc_key(doc) for doc in hybrid.fuse(text, chroma.similarity_search_by_vector(v, hybrid.fetch_k))]
+        lexical = ("bm25", "hybrid-chroma")
+
+    truth, _ = timed(numpy_search(exact), queries, vectors)
+    results = {}
+    print(f"{len(queries)} queries, k={k}, {len(exact.docs)} chunks, metric={exact.metric}")
+    for name, search in backends.items():
+        search(queries[0], vectors[0])  # warm up
+        ids, latencies = timed(search, queries, vectors)
+        hits = statistics.mean(source in found for source, found in zip(sources, ids))
+        recall = None
+        if name not in lexical:
+            recall = statistics.mean(len(set(a) & set(t)) / len(t) for a, t in zip(ids, truth))
+        results[name] = {
+            "recall_at_k": recall,
+            "hit_at_k": hits,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        }
+        recall_text = f"{recall:.3f}" if recall is not None else "    -"
+        print(f"  {name:<22} recall@{k} {recall_text}  hit@{k} {hits:.3f}  "
+              f"p50 {results[name]['p50_ms']:7.2f} ms  p95 {results[name]['p95_ms']:7.2f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"k": k, "queries": len(queries), "backends": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Cold-start time of the FastAPI RAG service.
+
+Starts the app with uvicorn several times and measures the wall time until
+/ready answers 200, together with the phases the app reports itself
+(module import, component loading, model pre-warming).
+
+    python bench_startup.py --runs 5 --ollama-url http://127.0.0.1:11435
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+POLL_SECONDS = 0.02  # /ready polling interval; bounds the measurement error
+TIMEOUT = 120
+
+
+def time_to_ready(port, env, timeout=TIMEOUT):
+    """Start the app and poll /ready until it answers 200; return the process,
+    the wall time from launch to that response and the report it carried."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    with httpx.Client(timeout=1) as http:
+        while time.perf_counter() - start < timeout:
+            try:
+                resp = http.get(f"http://127.0.0.1:{port}/ready")
+                if resp.status_code == 200:
+                    return proc, time.perf_counter() - start, resp.json()
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"app exited with {proc.returncode}")
+            time.sleep(POLL_SECONDS)
+    proc.terminate()
+    proc.wait()
+    raise RuntimeError(f"app was not ready within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app startup time.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        proc, elapsed, report = time_to_ready(args.port, {"OLLAMA_URL": args.ollama_url})
+        proc.terminate()
+        proc.wait()
+        report["wall_seconds"] = round(elapsed, 3)
+        runs.append(report)
+        print(f"  run {i + 1}: ready after {elapsed:.2f}s  "
+              f"(import {report['import_seconds']:.2f}s, load {report['load_seconds']:.2f}s, "
+              f"prewarm {report.get('prewarm', {})})")
+
+    median = statistics.median(run["wall_seconds"] for run in runs)
+    print(f"Median time to ready: {median:.2f}s over {len(runs)} runs")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"median_wall_seconds": median, "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
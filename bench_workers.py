@@ -0,0 +1,112 @@
+"""Memory per worker of the multi-process server, as the worker count grows.
+
+Starts ``serve.py`` with 1, 2 and 4 workers, sends some questions so every
+worker has touched the index, then reads each worker's RSS and PSS from
+/proc (Linux only). PSS splits shared pages between the processes mapping
+them, so with a shared snapshot it stays flat while RSS counts the shared
+index in every worker.
+
+    python bench_workers.py --ollama-url http://127.0.0.1:11435
+    python bench_workers.py --backend chroma   # one Chroma client per worker
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+import httpx
+
+
+def descendants(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children", "r") as f:
+            children += [int(c) for c in f.read().split()]
+    return children + [d for c in children for d in descendants(c)]
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def workers_of(pid):
+    pids = []
+    for child in descendants(pid):
+        with open(f"/proc/{child}/cmdline", "rb") as f:
+            cmdline = f.read()
+        if b"spawn_main" in cmdline and b"resource_tracker" not in cmdline:
+            pids.append(child)
+    return pids
+
+
+def run(workers, port, backend, ollama_url, questions):
+    env = {**os.environ, "OLLAMA_URL": ollama_url}
+    proc = subprocess.Popen([sys.executable, "serve.py", "--workers", str(workers),
+                             "--port", str(port), "--backend", backend], env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 180
+        while time.time() < deadline:
+            try:
+                if httpx.get(url + "/ready", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        else:
+            raise RuntimeError("server did not become ready within 180s")
+
+        # Spread requests over the workers; unique questions skip the answer cache
+        with httpx.Client(timeout=120) as http:
+            for i in range(questions * workers):
+                http.post(url + "/ask", json={"question": f"warming question {i}"})
+
+        # uvicorn serves in the main process when there is a single worker
+        pids = workers_of(proc.pid) or [proc.pid]
+        rss, pss = zip(*(memory_kb(pid) for pid in pids))
+        return {
+            "workers": len(pids),
+            "rss_mb_per_worker": statistics.mean(rss) / 1024,
+            "pss_mb_per_worker": statistics.mean(pss) / 1024,
+            "pss_mb_total": sum(pss) / 1024,
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per worker.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", default="numpy")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--questions", type=int, default=8, help="Questions per worker.")
+    parser.add_argument("--ollama-url", default=os.getenv("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.workers:
+        result = run(n, args.port, args.backend, args.ollama_url, args.questions)
+        results.append(result)
+        print(f"  workers={result['workers']:<3} RSS/worker {result['rss_mb_per_worker']:7.1f} MB  "
+              f"PSS/worker {result['pss_mb_per_worker']:7.1f} MB  "
+              f"PSS total {result['pss_mb_total']:7.1f} MB")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+import os
+import re
+import json
+import math
+import shutil
+import threading
+import unicodedata
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from chunk_store import RecordTable, chunk_id, write_record_table
+
+# ----- CONFIG -----
+BM25_DIR = "bm25"
+K1 = 1.2
+B = 0.75
+SEGMENT_SIZE = 50000  # Chunks per segment written by one update
+MAX_SEGMENTS = 8  # More segments than this are merged into one
+FETCH_K = 20  # Candidates taken from each retriever before fusion
+RRF_K = 60  # Reciprocal rank fusion constant
+MANIFEST = "segments.json"
+
+# Words joined by "." or "-" stay one token ("ssp5-8.5", "spm.1", "2.3"), so
+# section numbers and scenario names can be matched exactly
+TOKEN_RE = re.compile(r"\w+(?:[.\-]\w+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "their there these this to was were which will with".split()
+)
+
+
+def tokenize(text):
+    """Lowercased terms of ``text``; compound terms also yield their parts."""
+    tokens = []
+    for token in TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "." in token or "-" in token:
+            tokens.extend(part for part in re.split(r"[.\-]", token) if part not in STOPWORDS)
+    return tokens
+
+
+def doc_key(doc):
+    """Chunk ID of a retrieved document, as stored in Chroma and the BM25 index."""
+    return doc.id or chunk_id(doc.page_content, doc.metadata)
+
+
+def reciprocal_rank_fusion(rankings, k=4, rrf_k=RRF_K):
+    """Merge ranked document lists: each document scores sum(1 / (rrf_k + rank))."""
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+def _write_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def write_segment(path, docs):
+    """Write one immutable segment: documents, lengths and postings per term.
+
+    Postings of a term are a contiguous slice of ``postings.npy`` (row
+    numbers) and ``tfs.npy`` (term frequencies); ``terms.json`` maps each
+    term to its slice.
+    """
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    postings = defaultdict(list)
+    ids = []
+    lengths = []
+
+    def records():
+        for row, doc in enumerate(docs):
+            tokens = tokenize(doc["page_content"])
+            for term, tf in Counter(tokens).items():
+                postings[term].append((row, tf))
+            ids.append(doc["id"])
+            lengths.append(len(tokens))
+            yield doc
+
+    offsets = write_record_table(os.path.join(tmp, "docs.jsonl"), records())
+    terms = {}
+    rows = []
+    tfs = []
+    for term in sorted(postings):
+        terms[term] = [len(rows), len(rows) + len(postings[term])]
+        for row, tf in postings[term]:
+            rows.append(row)
+            tfs.append(tf)
+
+    np.save(os.path.join(tmp, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(tmp, "ids.npy"), np.asarray(ids, dtype="S64"))
+    np.save(os.path.join(tmp, "lengths.npy"), np.asarray(lengths, dtype=np.int32))
+    np.save(os.path.join(tmp, "postings.npy"), np.asarray(rows, dtype=np.int32))
+    np.save(os.path.join(tmp, "tfs.npy"), np.asarray(tfs, dtype=np.float32))
+    with open(os.path.join(tmp, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return len(ids)
+
+
+class Segment:
+    """Memory-mapped view of one immutable segment. Its tombstones belong to
+    the manifest, so they are kept by ``IndexView`` rather than here."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.ids = load("ids.npy")
+        self.lengths = load("lengths.npy")
+        self.postings = load("postings.npy")
+        self.tfs = load("tfs.npy")
+        self.docs = RecordTable(os.path.join(path, "docs.jsonl"), load("doc_offsets.npy"))
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load_deleted(self, tombstone=None):
+        """The deleted-row mask stored in ``tombstone`` (a file of this segment)."""
+        if tombstone is None:
+            return np.zeros(len(self.ids), bool)
+        return np.load(os.path.join(self.path, tombstone))
+
+    def live_docs(self, deleted):
+        for row in np.flatnonzero(~deleted):
+            yield self.docs[int(row)]
+
+    def close(self):
+        """Unmap the segment files; the segment can't be read afterwards."""
+        self.__dict__.pop("docs").close()
+        for name in ("ids", "lengths", "postings", "tfs"):
+            self.__dict__.pop(name, None)
+
+
+class IndexView:
+    """The segments of one manifest with their tombstones and statistics. A
+    reload swaps in a new view, so a search keeps using the view (and the
+    memory maps) it started with; segments that only a replaced view still
+    uses are closed when its last search returns."""
+
+    def __init__(self, segments, deleted, tombstones):
+        self.segments = segments
+        self.deleted = deleted  # per segment, True for tombstoned rows
+        self.tombstones = tombstones  # segment name -> tombstone file
+        self.num_docs = int(sum((~mask).sum() for mask in deleted))
+        total = sum(int(seg.lengths[~mask].sum()) for seg, mask in zip(segments, deleted))
+        # 1.0 when every live chunk is empty, which would otherwise divide by zero
+        self.avgdl = total / self.num_docs if total else 1.0
+
+
+class BM25Index:
+    """Persistent BM25 index over the chunks, updated incrementally.
+
+    The index is a list of immutable segments plus per-segment tombstones,
+    all on disk, so several app workers share the same pages. Tombstones are
+    written as new files per commit (``deleted-<generation>.npy``) and named
+    in ``segments.json``, so ``commit`` publishes the buffered chunks and the
+    deletions together with one ``os.replace`` of the manifest; readers pick
+    up the new manifest on their next search.
+    """
+
+    def __init__(self, index_dir=BM25_DIR):
+        self.index_dir = index_dir
+        self.view = IndexView([], [], {})
+        self.next = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._readers = {}  # view -> searches using it
+        self._pending = []
+        self._new = []
+        self._clear = False
+        self._mtime = None
+        os.makedirs(index_dir, exist_ok=True)
+        self.reload()
+
+    # ----- READING -----
+    def _manifest_path(self):
+        return os.path.join(self.index_dir, MANIFEST)
+
+    def _manifest_mtime(self):
+        try:
+            return os.stat(self._manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"next": 0, "generation": 0, "segments": [], "tombstones": {}}
+
+    def _open_view(self, manifest):
+        old = {seg.name: seg for seg in self.view.segments}
+        opened = []
+        segments = []
+        deleted = []
+        tombstones = manifest.get("tombstones", {})
+        try:
+            for name in manifest["segments"]:
+                seg = old.get(name)
+                if seg is None:
+                    seg = Segment(os.path.join(self.index_dir, name))
+                    opened.append(seg)
+                segments.append(seg)
+                deleted.append(seg.load_deleted(tombstones.get(name)))
+        except FileNotFoundError:
+            for seg in opened:
+                seg.close()
+            raise
+        return IndexView(segments, deleted, tombstones)
+
+    def _release(self, view):
+        # Called with the lock held, once ``view`` is neither current nor read
+        in_use = {id(seg) for v in [self.view, *self._readers] for seg in v.segments}
+        for seg in view.segments:
+            if id(seg) not in in_use:
+                seg.close()
+
+    def _reload(self):
+        # Called with the lock held
+        for attempt in range(3):
+            mtime = self._manifest_mtime()
+            manifest = self._read_manifest()
+            try:
+                view = self._open_view(manifest)
+                break
+            except FileNotFoundError:
+                # A commit replaced the manifest and removed files it named; read it again
+                if attempt == 2:
+                    raise
+        old, self.view = self.view, view
+        self._mtime = mtime
+        self.next = manifest["next"]
+        self.generation = manifest.get("generation", 0)
+        if not self._readers.get(old):
+            self._release(old)
+
+    def reload(self):
+        """Open the published manifest; searches in flight finish on the old view."""
+        with self._lock:
+            self._reload()
+
+    @property
+    def segments(self):
+        return self.view.segments
+
+    def maybe_reload(self):
+        if self._manifest_mtime() != self._mtime:
+            with self._lock:
+                if self._manifest_mtime() != self._mtime:
+                    self._reload()
+
+    @contextmanager
+    def _reading(self):
+        """The current view, with its segments kept open until the caller is done."""
+        self.maybe_reload()
+        with self._lock:
+            view = self.view
+            self._readers[view] = self._readers.get(view, 0) + 1
+        try:
+            yield view
+        finally:
+            with self._lock:
+                self._readers[view] -= 1
+                if not self._readers[view]:
+                    del self._readers[view]
+                    if view is not self.view:
+                        self._release(view)
+
+    def ids(self):
+        """IDs of every live chunk in the index (none once ``clear`` is pending)."""
+        ids = set()
+        if self._clear:
+            return ids
+        view = self.view
+        for seg, deleted in zip(view.segments, view.deleted):
+            ids |= {i.decode() for i in seg.ids[~deleted]}
+        return ids
+
+    def search(self, query, k=4):
+        """Top-k ``(Document, score)`` pairs by BM25 over all live chunks."""
+        terms = set(tokenize(query))
+        with self._reading() as view:
+            if not terms or not view.num_docs:
+                return []
+
+            # Document frequencies over all segments (tombstoned rows included,
+            # as in Lucene; they are purged when segments are merged)
+            idf = {}
+            for term in terms:
+                df = sum(seg.terms[term][1] - seg.terms[term][0]
+                         for seg in view.segments if term in seg.terms)
+                if df:
+                    idf[term] = math.log(1 + (view.num_docs - df + 0.5) / (df + 0.5))
+
+            hits = []
+            for s, seg in enumerate(view.segments):
+                scores = None
+                for term, weight in idf.items():
+                    span = seg.terms.get(term)
+                    if span is None:
+                        continue
+                    rows = seg.postings[span[0]:span[1]]
+                    tf = seg.tfs[span[0]:span[1]]
+                    norm = K1 * (1 - B + B * seg.lengths[rows] / view.avgdl)
+                    if scores is None:
+                        scores = np.zeros(len(seg), dtype=np.float32)
+                    scores[rows] += weight * tf * (K1 + 1) / (tf + norm)
+                if scores is None:
+                    continue
+                scores[view.deleted[s]] = 0
+                top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+                hits.extend((float(scores[r]), s, int(r)) for r in top if scores[r] > 0)
+
+            hits.sort(key=lambda hit: -hit[0])
+            results = []
+            for score, s, row in hits[:k]:
+                record = view.segments[s].docs[row]
+                results.append((Document(page_content=record["page_content"],
+                                         metadata=record["metadata"], id=record["id"]), score))
+            return results
+
+    # ----- WRITING -----
+    def _segment_name(self):
+        name = f"seg-{self.next:06d}"
+        self.next += 1
+        return name
+
+    def _flush(self):
+        if self._pending:
+            name = self._segment_name()
+            write_segment(os.path.join(self.index_dir, name), self._pending)
+            self._new.append(name)
+            self._pending = []
+
+    def add(self, doc):
+        """Buffer a chunk dict (``id``, ``page_content``, ``metadata``) for the next commit."""
+        self._pending.append(doc)
+        if len(self._pending) >= SEGMENT_SIZE:
+            self._flush()
+
+    def clear(self):
+        """Drop every segment on the next commit; until then readers see them."""
+        self._clear = True
+
+    def commit(self, deleted_ids=()):
+        """Tombstone ``deleted_ids``, publish buffered chunks, merge if needed."""
+        self._flush()
+        view = self.view
+        kept = [] if self._clear else zip(view.segments, view.deleted)
+        ids = np.asarray(list(set(deleted_ids)), dtype="S64")
+        self.generation += 1
+        tombstone = f"deleted-{self.generation:06d}.npy"
+        removed = 0
+        names = []
+        tombstones = {}
+        for seg, deleted in kept:
+            hits = np.isin(seg.ids, ids) & ~deleted if len(ids) else None
+            if hits is not None and hits.any():
+                removed += int(hits.sum())
+                deleted = deleted | hits
+                if deleted.all():
+                    continue
+                # A new file: the live manifest still names the previous one
+                np.save(os.path.join(seg.path, tombstone), deleted)
+                tombstones[seg.name] = tombstone
+            elif seg.name in view.tombstones:
+                tombstones[seg.name] = view.tombstones[seg.name]
+            names.append(seg.name)
+        names += self._new
+        self._new = []
+        self._clear = False
+
+        if len(names) > MAX_SEGMENTS:
+            live = [Segment(os.path.join(self.index_dir, name)) for name in names]
+            name = self._segment_name()
+            write_segment(os.path.join(self.index_dir, name),
+                          (doc for seg in live
+                           for doc in seg.live_docs(seg.load_deleted(tombstones.get(seg.name)))))
+            for seg in live:
+                seg.close()
+            names = [name]
+            tombstones = {}
+
+        _write_json(self._manifest_path(), {"next": self.next, "generation": self.generation,
+                                            "segments": names, "tombstones": tombstones})
+        # Files no longer listed are only removed once the new manifest is
+        # visible; readers that still map them keep working until they reload
+        for entry in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, entry)
+            if entry.startswith("seg-") and entry not in names:
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry in names:
+                for file in os.listdir(path):
+                    if file.startswith("deleted-") and file != tombstones.get(entry):
+                        os.remove(os.path.join(path, file))
+        self.reload()
+        return removed
+
+
+class HybridRetriever(BaseRetriever):
+    """Vector search and BM25 search fused by reciprocal rank."""
+
+    vectorstore: VectorStore
+    index: BM25Index
+    k: int = 4
+    fetch_k: int = FETCH_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        vector_docs = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        return self.fuse(query, vector_docs)
+
+    def fuse(self, query, vector_docs):
+        """Fuse already retrieved vector results with BM25 results for ``query``."""
+        lexical_docs = [doc for doc, _ in self.index.search(query, self.fetch_k)]
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], self.k)
@@ -0,0 +1,147 @@
+import os
+import gzip
+import json
+import hashlib
+import mmap
+
+# ----- CONFIG -----
+CHUNK_EXT = ".jsonl"
+COMPRESSED_EXT = ".jsonl.gz"
+LEGACY_EXT = ".json"  # one JSON array per PDF, written by older ingest runs
+SECTIONS_EXT = ".sections.json"  # side index of layout-chunked PDFs
+
+
+def chunk_filename(pdf_name, compress=False):
+    return pdf_name + (COMPRESSED_EXT if compress else CHUNK_EXT)
+
+
+def sections_filename(pdf_name):
+    return pdf_name + SECTIONS_EXT
+
+
+def chunk_id(page_content, metadata):
+    """Stable ID for a chunk: identical content and metadata always map to the same ID."""
+    payload = json.dumps(
+        {"page_content": page_content, "metadata": metadata},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_chunk_file(fn):
+    return fn.endswith((".pdf" + CHUNK_EXT, ".pdf" + COMPRESSED_EXT, ".pdf" + LEGACY_EXT))
+
+
+def _open(path, mode, compressed):
+    if compressed:
+        raw = open(path, mode + "b")
+        # mtime=0 and no embedded filename keep compressed output reproducible
+        return gzip.GzipFile(filename="", mode=mode + "b", fileobj=raw, mtime=0,
+                             compresslevel=6), raw
+    return open(path, mode + "b"), None
+
+
+class ChunkWriter:
+    """Streams chunk records to a JSONL file, one JSON object per line.
+
+    Records go to a temporary file that replaces ``path`` only when the writer
+    is closed without error, so readers never see a half-written file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.count = 0
+        self._f, self._raw = _open(self.tmp_path, "w", path.endswith(".gz"))
+
+    def write(self, record):
+        self._f.write(json.dumps(record).encode("utf-8") + b"\n")
+        self.count += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def close(self, commit=True):
+        self._f.close()
+        if self._raw is not None:
+            self._raw.close()
+        if commit:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+
+def read_chunks(path):
+    """Yield chunk records from a chunk file one at a time."""
+    if path.endswith(LEGACY_EXT):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+
+    f, raw = _open(path, "r", path.endswith(".gz"))
+    try:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        f.close()
+        if raw is not None:
+            raw.close()
+
+
+def chunk_files(chunks_dir):
+    return [
+        os.path.join(chunks_dir, fn)
+        for fn in sorted(os.listdir(chunks_dir))
+        if is_chunk_file(fn)
+    ]
+
+
+def iter_chunks(chunks_dir):
+    """Yield every chunk record in ``chunks_dir``, file by file."""
+    for path in chunk_files(chunks_dir):
+        yield from read_chunks(path)
+
+
+class RecordTable:
+    """Random access to the records of a JSONL file by row number.
+
+    ``offsets`` holds the byte offset of every line plus the file size; the
+    file itself is memory-mapped, so only the rows actually read are paged in
+    and several processes opening the same table share its pages.
+    """
+
+    def __init__(self, path, offsets):
+        self.offsets = offsets
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return json.loads(self._mm[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    def close(self):
+        if self._mm:
+            self._mm.close()
+        self._file.close()
+
+
+def write_record_table(path, records):
+    """Write records as JSONL and return the list of line offsets for RecordTable."""
+    offsets = [0]
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(json.dumps(record).encode("utf-8") + b"\n")
+            offsets.append(f.tell())
+    return offsets
@@ -0,0 +1,142 @@
+import os
+import re
+
+# ----- CONFIG -----
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "768"))
+ENCODING = "cl100k_base"
+MIN_OVERLAP = 30  # Shortest shared text (chars) treated as splitter overlap
+MIN_PASSAGE_TOKENS = 48  # Don't add a truncated passage shorter than this
+
+SENTENCE_END_RE = re.compile(r"[.!?](?=\s)")
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken; falls back to ~4 characters per token
+    when the encoding can't be loaded (tiktoken downloads it on first use)."""
+
+    def __init__(self, encoding=ENCODING):
+        try:
+            import tiktoken
+            self.encoding = tiktoken.get_encoding(encoding)
+        except Exception as e:
+            print(f"tiktoken encoding '{encoding}' unavailable ({type(e).__name__}); "
+                  "estimating 4 characters per token")
+            self.encoding = None
+
+    def count(self, text):
+        if self.encoding is None:
+            return (len(text) + 3) // 4
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        """Longest prefix of ``text`` within ``max_tokens``, cut at a sentence end if possible."""
+        if self.encoding is None:
+            cut = text[:max_tokens * 4]
+        else:
+            cut = self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+        if len(cut) >= len(text):
+            return text
+        ends = [m.end() for m in SENTENCE_END_RE.finditer(cut)]
+        if ends and ends[-1] > len(cut) // 2:
+            cut = cut[:ends[-1]]
+        return cut.rstrip() + " …"
+
+
+_counter = None
+
+
+def token_counter():
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
+
+
+def overlap(a, b, min_len=MIN_OVERLAP):
+    """Length of the longest suffix of ``a`` that is also a prefix of ``b``."""
+    if len(b) < min_len or len(a) < min_len:
+        return 0
+    head = b[:min_len]
+    start = a.find(head, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(head, start + 1)
+    return 0
+
+
+class Passage:
+    def __init__(self, doc, rank):
+        self.text = doc.page_content.strip()
+        self.rank = rank
+        self.source = doc.metadata.get("source")
+        self.page = doc.metadata.get("page", -1)
+
+    def absorb(self, other):
+        """Merge ``other`` into this passage if it duplicates or continues it."""
+        if self.source != other.source:
+            return False
+        if other.text in self.text:
+            pass
+        elif self.text in other.text:
+            self.text = other.text
+        elif overlap(self.text, other.text):
+            self.text += other.text[overlap(self.text, other.text):]
+        elif overlap(other.text, self.text):
+            self.text = other.text + self.text[overlap(other.text, self.text):]
+        else:
+            return False
+        self.rank = min(self.rank, other.rank)
+        self.page = min(self.page, other.page)
+        return True
+
+
+def pack_context(docs, budget=CONTEXT_TOKEN_BUDGET, counter=None):
+    """Build the "stuff" context from retrieved documents.
+
+    ``docs`` are in retrieval order (best first). Duplicate chunks are
+    dropped and chunks that overlap another chunk of the same source (the
+    splitter's chunk_overlap) are stitched into one passage. Passages are
+    selected by rank (a stitched passage takes its best chunk's rank) until
+    ``budget`` tokens are used; the passage that crosses the budget is
+    truncated at a sentence end. The selected passages are then emitted in
+    reading order (source, then page). Returns ``(context, stats)`` with the
+    chunk, passage and packed token counts.
+    """
+    counter = counter or token_counter()
+    passages = []
+    for rank, doc in enumerate(docs):
+        passage = Passage(doc, rank)
+        if not passage.text:
+            continue
+        # Absorbing can make a passage continue another one, so merge to a fixpoint
+        while True:
+            host = next((p for p in passages if p.absorb(passage)), None)
+            if host is None:
+                passages.append(passage)
+                break
+            passages.remove(host)
+            passage = host
+    passages.sort(key=lambda p: p.rank)
+
+    selected = []
+    used = 0
+    for passage in passages:
+        remaining = budget - used
+        tokens = counter.count(passage.text)
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            passage.text = counter.truncate(passage.text, remaining)
+            tokens = counter.count(passage.text)
+        selected.append(passage)
+        used += tokens + 1  # the blank line joining passages
+    selected.sort(key=lambda p: (str(p.source), p.page))
+
+    context = "\n\n".join(p.text for p in selected)
+    stats = {
+        "chunks": len(docs),
+        "passages": len(selected),
+        "tokens_packed": counter.count(context),
+    }
+    return context, stats
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import atexit
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, keep to one writer by hand
+    fcntl = None
+
+# ----- CONFIG -----
+CACHE_DIR = os.getenv("EMBED_CACHE_DIR", ".embed_cache")
+MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+KEY_BYTES = 16
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Unicode-normalize and collapse whitespace so trivially different copies share a key."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model, text):
+    payload = model.encode("utf-8") + b"\0" + normalize_text(text).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Fixed-capacity on-disk embedding cache for one model, with LRU eviction.
+
+    Everything lives in memory-mapped arrays under ``<cache_dir>/<model>/``:
+
+    - ``vectors.f32``: ``capacity x dim`` float32 vectors, one slot per entry
+    - ``keys.bin``: the 16-byte key stored in each slot
+    - ``ticks.u64``: last-access tick of each slot (0 means empty)
+
+    The key <-> slot index and LRU order are rebuilt from ``keys``/``ticks`` on
+    open, so there is no separate index file to keep in sync. A slot's key is
+    checked on every read, so a slot being reused never serves a stale vector.
+    ``max_entries=0`` disables the cache.
+
+    One process writes to a cache directory at a time: a writable cache holds
+    an exclusive lock on ``writer.lock`` while it is open, and a process that
+    can't get it opens the cache read-only instead. Resizing or a change of
+    dimension writes a new generation of the files and switches ``meta.json``
+    to it with one ``os.replace``, so readers never see truncated files.
+    """
+
+    def __init__(self, model, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, read_only=False):
+        self.model = model
+        self.capacity = max_entries
+        self.read_only = read_only
+        self.dir = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model))
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> slot, least recently used first
+        self._clock = 0
+        self._vectors = self._keys = self._ticks = None
+        self._generation = 0
+        self._writer_lock = None
+
+        if not max_entries:
+            # Capacity 0 disables the cache (a zero-length file can't be mapped);
+            # an existing cache directory is left as it is
+            self.capacity = 0
+            return
+        if not read_only:
+            self.read_only = read_only = not self._acquire_writer()
+
+        meta_path = os.path.join(self.dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._generation = meta.get("generation", 0)
+            try:
+                self._open(meta["dim"], meta["capacity"], "r" if read_only else "r+")
+            except FileNotFoundError:
+                # A writer replaced this generation between reading meta.json and
+                # opening it (or the files were removed); start empty
+                self.dim, self.capacity = None, 0 if read_only else max_entries
+            if self.capacity != max_entries and not read_only:
+                self._resize(max_entries)
+        elif read_only:
+            self.capacity = 0
+        if not read_only:
+            atexit.register(self.flush)
+
+    # ----- STORAGE -----
+    def _acquire_writer(self):
+        """Take the directory's writer lock; False if another process holds it."""
+        os.makedirs(self.dir, exist_ok=True)
+        if fcntl is None:
+            return True
+        lock = open(os.path.join(self.dir, "writer.lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._writer_lock = lock  # released when the process exits
+        return True
+
+    def _paths(self, generation=None):
+        generation = self._generation if generation is None else generation
+        suffix = f".{generation}" if generation else ""
+        return (os.path.join(self.dir, f"vectors{suffix}.f32"),
+                os.path.join(self.dir, f"keys{suffix}.bin"),
+                os.path.join(self.dir, f"ticks{suffix}.u64"))
+
+    def _open(self, dim, capacity, mode):
+        vectors_path, keys_path, ticks_path = self._paths()
+        self.dim = dim
+        self.capacity = capacity
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self._keys = np.memmap(keys_path, dtype=np.uint8, mode=mode, shape=(capacity, KEY_BYTES))
+        self._ticks = np.memmap(ticks_path, dtype=np.uint64, mode=mode, shape=(capacity,))
+
+        self._index.clear()
+        used = np.flatnonzero(self._ticks)
+        for slot in used[np.argsort(self._ticks[used], kind="stable")]:
+            self._index[bytes(self._keys[slot])] = int(slot)
+        self._clock = int(self._ticks.max()) if capacity else 0
+
+    def _create(self, dim):
+        """Start a new, empty generation of the files and point meta.json at it."""
+        old_paths = self._paths() if self.dim is not None else ()
+        self._generation += 1
+        self._open(dim, self.capacity, "w+")
+        meta_path = os.path.join(self.dir, "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": dim, "capacity": self.capacity,
+                       "generation": self._generation}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        # Readers that still map the old generation keep it until they reopen
+        for path in old_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _resize(self, capacity):
+        """Rewrite the cache with a new capacity, keeping the most recently used entries."""
+        keep = list(self._index.items())[-capacity:] if capacity else []
+        vectors = np.array([self._vectors[slot] for _, slot in keep], dtype=np.float32)
+        ticks = np.array([self._ticks[slot] for _, slot in keep], dtype=np.uint64)
+        self.capacity = capacity
+        self._create(self.dim)  # new files; the arrays copied above stay valid
+        for new_slot, (key, _) in enumerate(keep):
+            self._vectors[new_slot] = vectors[new_slot]
+            self._keys[new_slot] = np.frombuffer(key, dtype=np.uint8)
+            self._ticks[new_slot] = ticks[new_slot]
+        self._open(self.dim, capacity, "r+")
+
+    # ----- API -----
+    def get(self, text):
+        """Return the cached vector for ``text`` as a list of floats, or None."""
+        key = cache_key(self.model, text)
+        with self._lock:
+            slot = self._index.get(key)
+            if slot is None or bytes(self._keys[slot]) != key:
+                self.misses += 1
+                return None
+            if not self.read_only:
+                self._clock += 1
+                self._ticks[slot] = self._clock
+                self._index.move_to_end(key)
+            self.hits += 1
+            return self._vectors[slot].tolist()
+
+    def put(self, text, vector):
+        if not self.capacity or self.read_only:
+            return
+        key = cache_key(self.model, text)
+        with self._lock:
+            if self.dim is None:
+                self._create(len(vector))
+            elif len(vector) != self.dim:
+                # The model behind this name changed shape; start over
+                self._create(len(vector))
+
+            slot = self._index.pop(key, None)
+            if slot is None:
+                if len(self._index) < self.capacity:
+                    slot = len(self._index)
+                else:
+                    _, slot = self._index.popitem(last=False)
+            self._clock += 1
+            self._vectors[slot] = vector
+            self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._ticks[slot] = self._clock
+            self._index[key] = slot
+
+    def flush(self):
+        if self.read_only:
+            return
+        with self._lock:
+            for arr in (self._vectors, self._keys, self._ticks):
+                if arr is not None:
+                    arr.flush()
+
+    def __len__(self):
+        return len(self._index)
+
+    def stats(self):
+        return {"entries": len(self._index), "capacity": self.capacity,
+                "read_only": self.read_only, "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an ``Embeddings`` object and only calls it for texts not in the cache."""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = [self.cache.get(t) for t in texts]
+
+        # Embed each distinct missing text once
+        missing = OrderedDict()
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                missing.setdefault(normalize_text(text), []).append(i)
+        if missing:
+            firsts = [positions[0] for positions in missing.values()]
+            embedded = self.embeddings.embed_documents([texts[i] for i in firsts])
+            for positions, vector in zip(missing.values(), embedded):
+                self.cache.put(texts[positions[0]], vector)
+                for i in positions:
+                    vectors[i] = list(vector)
+        return vectors
+
+    def embed_query(self, text):
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, vector)
+        return list(vector)
@@ -0,0 +1,125 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.embeddings import Embeddings
+
+# ----- CONFIG -----
+OLLAMA_URL = "http://localhost:11434"
+EMBED_BATCH_SIZE = 32  # Texts per /api/embed request
+MAX_IN_FLIGHT = 4  # Concurrent requests kept open against the server
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 0.5  # Doubled after every failed attempt
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class OllamaEmbeddingPipeline(Embeddings):
+    """Embeds texts through Ollama's /api/embed with several batches in flight.
+
+    Texts are cut into batches of ``batch_size`` and sent from a thread pool
+    over one pooled HTTP session. At most ``max_in_flight`` batches are
+    outstanding at any time; the next batch is only taken from the input once
+    a slot frees up, so a slow server pushes back on the producer instead of
+    queueing the whole corpus in memory. Results always come back in input
+    order.
+
+    The class implements LangChain's ``Embeddings`` interface, so it can be
+    handed to LangChain's ``Chroma`` directly.
+    """
+
+    def __init__(self, model, base_url=OLLAMA_URL, batch_size=EMBED_BATCH_SIZE,
+                 max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF_SECONDS, timeout=120, keep_alive=None):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight,
+                                            thread_name_prefix="embed")
+
+        self._stats_lock = threading.Lock()
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+        self.retries = 0
+
+    # ----- HTTP -----
+    def _post(self, texts):
+        payload = {"model": self.model, "input": texts}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self.session.post(f"{self.base_url}/api/embed",
+                                         json=payload, timeout=self.timeout)
+                if resp.status_code not in RETRY_STATUS:
+                    resp.raise_for_status()
+                    return resp.json()["embeddings"]
+                error = requests.HTTPError(f"{resp.status_code} from {self.base_url}", response=resp)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            with self._stats_lock:
+                self.retries += 1
+            time.sleep(self.backoff * (2 ** attempt))
+
+    # ----- PIPELINE -----
+    def embed_batches(self, batches):
+        """Yield the embeddings of each batch of texts, in order.
+
+        ``batches`` may be any iterable (including a generator); it is consumed
+        lazily, never more than ``max_in_flight`` batches ahead of the caller.
+        """
+        pending = deque()
+        for batch in batches:
+            batch = list(batch)
+            if len(pending) >= self.max_in_flight:
+                yield pending.popleft().result()
+            pending.append(self._executor.submit(self._post, batch))
+        while pending:
+            yield pending.popleft().result()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        start = time.perf_counter()
+        batches = (texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size))
+        vectors = []
+        for embedded in self.embed_batches(batches):
+            vectors.extend(embedded)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.total_chunks += len(texts)
+            self.total_seconds += elapsed
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    # ----- STATS -----
+    @property
+    def chunks_per_second(self):
+        with self._stats_lock:
+            if not self.total_seconds:
+                return 0.0
+            return self.total_chunks / self.total_seconds
+
+    def report(self):
+        return (f"{self.total_chunks} chunks in {self.total_seconds:.1f}s "
+                f"({self.chunks_per_second:.1f} chunks/s, {self.retries} retries)")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
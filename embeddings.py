@@ -1,13 +1,23 @@
 import os
-import json
-from langchain_ollama import OllamaEmbeddings
+import uuid
+import argparse
 from langchain_community.vectorstores import Chroma
+from embed_pipeline import OllamaEmbeddingPipeline
+from embed_cache import CachedEmbeddings, EmbeddingCache
+from chunk_store import chunk_id, iter_chunks
+from vector_index import CURRENT_FILE, publish_snapshot
+from bm25_index import BM25_DIR, BM25Index
+from rag_metrics import Timings, write_job_metrics
 
 # ----- CONFIG -----
 CHUNKS_DIR = "chunks"
 PERSIST_DIR = "vectordb"
 MODEL_NAME = "nomic-embed-text:latest"
-OLLAMA_URL = "http://localhost:11434"  # Make sure your Ollama server is running here
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")  # Make sure your Ollama server is running here
+BATCH_SIZE = 256  # Chunks sent to the embedder / written to Chroma per call
+EMBED_BATCH_SIZE = 32  # Chunks per Ollama request
+MAX_IN_FLIGHT = 4  # Concurrent Ollama requests
+GENERATION_FILE = "generation"  # Changes whenever the store's contents change
 
 # ----- FUNCTIONS -----
 def test_ollama_connection(embedder):
@@ -21,42 +31,163 @@ def test_ollama_connection(embedder):
             f"Check that the server is running and the model '{MODEL_NAME}' is available."
         ) from e
 
-def embed_and_store(chunks_dir=CHUNKS_DIR, persist_directory=PERSIST_DIR):
-    # Initialize Ollama embeddings client
-    embedder = OllamaEmbeddings(model=MODEL_NAME, base_url=OLLAMA_URL)
+def iter_documents(chunks_dir=CHUNKS_DIR):
+    """Stream chunk dicts from the files written by ingest.py, tagged with their IDs."""
+    for it in iter_chunks(chunks_dir):
+        metadata = it.get("metadata", {})
+        yield {
+            "id": chunk_id(it["page_content"], metadata),
+            "page_content": it["page_content"],
+            "metadata": metadata
+        }
+
+def read_generation(persist_directory=PERSIST_DIR):
+    """Current generation token of the store, or None if it was never built."""
+    try:
+        with open(os.path.join(persist_directory, GENERATION_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def bump_generation(persist_directory=PERSIST_DIR):
+    """Publish a new generation token so caches built on the old store drop their entries."""
+    path = os.path.join(persist_directory, GENERATION_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(path + ".tmp", path)
+
+def stored_ids(vectordb, batch_size=BATCH_SIZE * 40):
+    """All IDs currently in the Chroma collection, fetched page by page."""
+    ids = set()
+    offset = 0
+    while True:
+        page = vectordb.get(include=[], limit=batch_size, offset=offset)["ids"]
+        ids.update(page)
+        if len(page) < batch_size:
+            return ids
+        offset += len(page)
+
+def embed_and_store(chunks_dir=CHUNKS_DIR, persist_directory=PERSIST_DIR,
+                    incremental=True, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT,
+                    index_dir=None, bm25_dir=BM25_DIR):
+    """Sync the Chroma store and the BM25 index with the chunk files.
+
+    In incremental mode only chunks whose ID is not yet stored are embedded,
+    and stored chunks that no longer appear in any chunk file (changed or
+    removed sources) are deleted. With ``incremental=False`` the collection is
+    dropped first and everything is re-embedded. The BM25 index used by
+    ``RAG_RETRIEVAL=hybrid`` is kept in step: chunks it lacks are added as a
+    new segment and removed chunks are tombstoned. If ``index_dir`` is given and
+    the store changed, a new NumPy index snapshot is published there for
+    ``RAG_BACKEND=numpy`` before the new generation is announced.
+    """
+    # Initialize Ollama embeddings client; each Chroma batch is embedded as
+    # several concurrent requests, and texts already embedded by an earlier
+    # run are served from the on-disk cache without calling the model
+    pipeline = OllamaEmbeddingPipeline(
+        model=MODEL_NAME,
+        base_url=OLLAMA_URL,
+        batch_size=EMBED_BATCH_SIZE,
+        max_in_flight=max_in_flight
+    )
+    cache = EmbeddingCache(MODEL_NAME)
+    embedder = CachedEmbeddings(pipeline, cache)
+
+    timings = Timings(histogram=None, tokens=None)
 
     # Test connection before processing all documents
-    test_ollama_connection(embedder)
+    with timings.span("connect"):
+        test_ollama_connection(embedder)
+
+    # Create or load Chroma vector store
+    vectordb = Chroma(persist_directory=persist_directory, embedding_function=embedder)
+    if not incremental:
+        vectordb.delete_collection()
+        vectordb = Chroma(persist_directory=persist_directory, embedding_function=embedder)
+    bm25 = BM25Index(bm25_dir)
+    if not incremental:
+        bm25.clear()
+
+    # Stream chunks from disk; only IDs, one batch of new chunks and at most
+    # one BM25 segment are held in memory at a time
+    with timings.span("scan_store"):
+        existing = stored_ids(vectordb)
+        indexed = bm25.ids()
+    current = set()
+    added = 0
+    batch = []
+
+    def flush(batch):
+        with timings.span("embed_store"):
+            vectordb.add_texts(
+                texts=[doc["page_content"] for doc in batch],
+                metadatas=[doc["metadata"] for doc in batch],
+                ids=[doc["id"] for doc in batch]
+            )
+        print(f"Embedded {added} new chunks")
 
-    # Load documents from JSON chunks
-    documents = []
-    for fn in os.listdir(chunks_dir):
-        if not fn.endswith(".json"):
+    for doc in iter_documents(chunks_dir):
+        # Exact duplicates collapse onto one vector
+        if doc["id"] in current:
             continue
-        with open(os.path.join(chunks_dir, fn), "r", encoding="utf8") as f:
-            items = json.load(f)
-        for it in items:
-            documents.append({
-                "page_content": it["page_content"],
-                "metadata": it.get("metadata", {})
-            })
-
-    if not documents:
+        current.add(doc["id"])
+        if doc["id"] not in indexed:
+            bm25.add(doc)
+        if doc["id"] in existing:
+            continue
+        batch.append(doc)
+        added += 1
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    if not current:
         raise ValueError(f"No documents found in {chunks_dir}")
 
-    # Create or load Chroma vector store
-    vectordb = Chroma.from_texts(
-        texts=[doc["page_content"] for doc in documents],
-        embedding=embedder,
-        metadatas=[doc["metadata"] for doc in documents],
-        persist_directory=persist_directory
-    )
+    stale = sorted(existing - current)
+    with timings.span("delete_stale"):
+        for i in range(0, len(stale), batch_size):
+            vectordb.delete(ids=stale[i:i + batch_size])
+    print(f"{added} new, {len(stale)} stale, "
+          f"{len(current) - added} unchanged chunks.")
+
+    lexical_added = len(current - indexed)
+    with timings.span("bm25_commit"):
+        lexical_removed = bm25.commit(indexed - current)
+    print(f"BM25 index: {lexical_added} added, {lexical_removed} removed, "
+          f"{len(bm25.segments)} segments.")
 
     vectordb.persist()
-    print(f"Vector store persisted to '{persist_directory}' with {len(documents)} documents.")
+    changed = added or stale or lexical_added or lexical_removed or not incremental
+    if index_dir and (changed or not os.path.exists(os.path.join(index_dir, CURRENT_FILE))):
+        with timings.span("publish_snapshot"):
+            publish_snapshot(vectordb, index_dir)
+    if changed:
+        bump_generation(persist_directory)
+    cache.flush()
+    print("Embedding throughput:", pipeline.report())
+    print("Embedding cache:", cache.stats())
+    print(f"Vector store persisted to '{persist_directory}' with {len(current)} documents.")
+    write_job_metrics("embeddings", timings, {
+        "new": added, "stale": len(stale), "unchanged": len(current) - added,
+        "bm25_added": lexical_added, "bm25_removed": lexical_removed,
+        "retries": pipeline.retries,
+        "cache_hits": cache.hits, "cache_misses": cache.misses,
+    })
     return vectordb
 
 # ----- MAIN -----
 if __name__ == "__main__":
-    embed_and_store()
-
+    parser = argparse.ArgumentParser(description="Embed chunks into the Chroma vector store.")
+    parser.add_argument("--full", action="store_true",
+                        help="Drop the collection and re-embed every chunk.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="Concurrent embedding requests sent to Ollama.")
+    parser.add_argument("--export-index", metavar="DIR", nargs="?", const="index",
+                        help="Also publish a NumPy index snapshot (default dir: index).")
+    args = parser.parse_args()
+    embed_and_store(incremental=not args.full, batch_size=args.batch_size,
+                    max_in_flight=args.max_in_flight, index_dir=args.export_index)
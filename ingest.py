@@ -1,13 +1,68 @@
 from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders.parsers import PyPDFParser
+from langchain_core.documents.base import Blob
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import argparse
+import hashlib
+import io
 import os
 import glob
 import json
 
+import pypdf
 
-def load_and_split(pdf_path, chunk_size=1000, chunk_overlap=200):
-    loader = PyPDFLoader(pdf_path)
-    docs = loader.load()
+from chunk_store import ChunkWriter, chunk_filename, sections_filename
+from layout_chunking import CHUNK_TOKENS, layout_split, section_index
+from rag_metrics import Timings, write_job_metrics
+
+# ----- CONFIG -----
+DATA_GLOB = "data/*.pdf"
+CHUNKS_DIR = "chunks"
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+CHUNKING = os.getenv("RAG_CHUNKING", "recursive")  # "recursive" (characters) or "layout" (tokens)
+
+
+def load_page_range(pdf_path, start, stop):
+    """Load pages [start, stop) of a PDF exactly as PyPDFLoader would.
+
+    The pages are copied into an in-memory PDF that keeps the original
+    document info, parsed with the same parser PyPDFLoader uses, and the
+    page-dependent metadata is mapped back onto the original document.
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    writer = pypdf.PdfWriter()
+    for page in reader.pages[start:stop]:
+        writer.add_page(page)
+    writer.metadata = reader.metadata
+
+    buf = io.BytesIO()
+    writer.write(buf)
+
+    docs = list(PyPDFParser().lazy_parse(Blob.from_data(buf.getvalue(), path=pdf_path)))
+    for offset, doc in enumerate(docs):
+        page = start + offset
+        doc.metadata["page"] = page
+        if "total_pages" in doc.metadata:
+            doc.metadata["total_pages"] = len(reader.pages)
+        if "page_label" in doc.metadata:
+            doc.metadata["page_label"] = reader.page_labels[page]
+    return docs
+
+
+def load_and_split(pdf_path, chunk_size=1000, chunk_overlap=200, pages=None,
+                   chunking="recursive", chunk_tokens=CHUNK_TOKENS):
+    if pages is None:
+        loader = PyPDFLoader(pdf_path)
+        docs = loader.load()
+    else:
+        docs = load_page_range(pdf_path, *pages)
+
+    if chunking == "layout":
+        return layout_split(docs, max_tokens=chunk_tokens)
 
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
@@ -18,26 +73,189 @@ def load_and_split(pdf_path, chunk_size=1000, chunk_overlap=200):
     return split_docs
 
 
-def main():
-    os.makedirs("chunks", exist_ok=True)
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
-    for p in glob.glob("data/*.pdf"):
-        print("Processing:", p)
 
-        docs = load_and_split(p)
-        out = [
-            {"page_content": d.page_content, "metadata": d.metadata}
-            for d in docs
-        ]
+def load_manifest(chunks_dir=CHUNKS_DIR):
+    path = os.path.join(chunks_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-        fn = os.path.join("chunks", os.path.basename(p) + ".json")
 
-        with open(fn, "w", encoding="utf-8") as f:
-            json.dump(out, f)
+def save_manifest(manifest, chunks_dir=CHUNKS_DIR):
+    # Write-then-rename so an interrupted run never leaves a truncated manifest
+    path = os.path.join(chunks_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
 
-        print("Saved:", fn)
 
+def plan_tasks(pdf_path, pages_per_task):
+    """Split a PDF into (path, page range) tasks; None means the whole file."""
+    if not pages_per_task:
+        return [(pdf_path, None)]
+    n_pages = len(pypdf.PdfReader(pdf_path).pages)
+    if n_pages <= pages_per_task:
+        return [(pdf_path, None)]
+    return [
+        (pdf_path, (start, min(start + pages_per_task, n_pages)))
+        for start in range(0, n_pages, pages_per_task)
+    ]
+
+
+def chunk_task(task):
+    """Process-pool entry point: return the serialized chunks of one task."""
+    pdf_path, pages, chunk_size, chunk_overlap, chunking, chunk_tokens = task
+    docs = load_and_split(pdf_path, chunk_size, chunk_overlap, pages=pages,
+                          chunking=chunking, chunk_tokens=chunk_tokens)
+    return [
+        {"page_content": d.page_content, "metadata": d.metadata}
+        for d in docs
+    ]
+
+
+def run_tasks(tasks, workers):
+    """Yield the result of each task in order, keeping a bounded number in flight."""
+    if workers == 1:
+        for task in tasks:
+            yield chunk_task(task)
+        return
+
+    workers = workers or os.cpu_count()
+    window = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(pool.submit(chunk_task, task))
+        while pending:
+            yield pending.popleft().result()
 
-if __name__ == "__main__":
-    main()
 
+def save_sections(sections, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sections, f, indent=1, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def remove_outputs(entry, chunks_dir):
+    for key in ("output", "sections"):
+        if key in entry:
+            path = os.path.join(chunks_dir, entry[key])
+            if os.path.exists(path):
+                os.remove(path)
+                print("Removed:", path)
+
+
+def main(data_glob=DATA_GLOB, chunks_dir=CHUNKS_DIR, workers=1, pages_per_task=0,
+         force=False, compress=False, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+         chunking=CHUNKING, chunk_tokens=CHUNK_TOKENS):
+    os.makedirs(chunks_dir, exist_ok=True)
+    timings = Timings(histogram=None, tokens=None)
+    counts = {"pdfs": 0, "unchanged": 0, "tasks": 0, "chunks": 0}
+
+    manifest = load_manifest(chunks_dir)
+    pdfs = sorted(glob.glob(data_glob))
+
+    # Drop outputs of PDFs that no longer exist
+    present = {os.path.basename(p) for p in pdfs}
+    for name in sorted(set(manifest) - present):
+        remove_outputs(manifest.pop(name), chunks_dir)
+    save_manifest(manifest, chunks_dir)
+
+    pending = []
+    with timings.span("scan"):
+        for p in pdfs:
+            name = os.path.basename(p)
+            entry = {
+                "sha256": file_sha256(p),
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "output": chunk_filename(name, compress),
+            }
+            if chunking == "layout":
+                del entry["chunk_size"], entry["chunk_overlap"]
+                entry.update(chunking="layout", chunk_tokens=chunk_tokens,
+                             sections=sections_filename(name))
+            fn = os.path.join(chunks_dir, entry["output"])
+            if not force and manifest.get(name) == entry and os.path.exists(fn):
+                print("Unchanged:", p)
+                counts["unchanged"] += 1
+                continue
+            pending.append((p, entry))
+
+    # Tasks of every file go through one stream; results come back in
+    # submission order, so each file is written exactly as a serial run would,
+    # one task's chunks at a time.
+    with timings.span("plan"):
+        # Layout chunking needs the whole document (running headers, chunks
+        # continuing onto the next page), so it always plans whole files
+        per_task = 0 if chunking == "layout" else pages_per_task
+        plans = [(p, entry, plan_tasks(p, per_task)) for p, entry in pending]
+    results = run_tasks(
+        ((pdf_path, pages, chunk_size, chunk_overlap, chunking, chunk_tokens)
+         for _, _, plan in plans
+         for pdf_path, pages in plan),
+        workers,
+    )
+    for p, entry, plan in plans:
+        print("Processing:", p, f"({len(plan)} task(s))")
+        name = os.path.basename(p)
+        fn = os.path.join(chunks_dir, entry["output"])
+        written = []
+        with ChunkWriter(fn) as writer:
+            for _ in plan:
+                # Time spent waiting for PDF loading and splitting (in the workers)
+                with timings.span("load_split"):
+                    chunks = next(results)
+                if chunking == "layout":
+                    written += chunks
+                with timings.span("write"):
+                    writer.write_many(chunks)
+        if chunking == "layout":
+            save_sections(section_index(written), os.path.join(chunks_dir, entry["sections"]))
+
+        previous = manifest.get(name)
+        if previous:
+            remove_outputs({key: previous[key] for key in ("output", "sections")
+                            if key in previous and previous[key] != entry.get(key)}, chunks_dir)
+        manifest[name] = entry
+        save_manifest(manifest, chunks_dir)
+        print("Saved:", fn, f"({writer.count} chunks)")
+        counts["pdfs"] += 1
+        counts["tasks"] += len(plan)
+        counts["chunks"] += writer.count
+
+    write_job_metrics("ingest", timings, counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split PDFs in data/ into JSONL chunk files.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (0 = one per CPU, 1 = serial).")
+    parser.add_argument("--pages-per-task", type=int, default=0,
+                        help="Split PDFs longer than this into page-range tasks (0 = whole files; "
+                             "ignored with --chunking layout).")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-ingest every PDF, ignoring the manifest.")
+    parser.add_argument("--compress", action="store_true",
+                        help="Write gzip-compressed chunk files (.jsonl.gz).")
+    parser.add_argument("--chunking", choices=["recursive", "layout"], default=CHUNKING,
+                        help="recursive: fixed 1000-character chunks with 200 overlap; layout: "
+                             "token-sized chunks aligned to headings and pages, with a "
+                             "<pdf>.sections.json side index.")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="Maximum tokens per chunk with --chunking layout.")
+    args = parser.parse_args()
+    main(workers=args.workers, pages_per_task=args.pages_per_task, force=args.force,
+         compress=args.compress, chunking=args.chunking, chunk_tokens=args.chunk_tokens)
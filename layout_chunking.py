@@ -0,0 +1,203 @@
+import os
+import re
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from chunk_store import chunk_id
+from context_packing import token_counter
+
+# ----- CONFIG -----
+CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "256"))  # Target size of a layout chunk
+MIN_CHUNK_TOKENS = 64  # Shorter chunks continue onto the next page instead of ending there
+MAX_HEADING_CHARS = 100
+REPEATED_LINE_PAGES = 3  # A first/last page line seen this often is a running header/footer
+
+# "1.2 Observed changes", "SPM.1 ...", "A.3.1 ...", "Chapter 4", "Box 2.1", "Table 3"
+HEADING_RE = re.compile(
+    r"^(?:(?:[A-Z]{1,3}\.)?\d+(?:\.\d+)*\.?|[A-Z]{1,3}\.\d+(?:\.\d+)*|"
+    r"(?:Chapter|Section|Box|Annex|Appendix|Part|Table|Figure)\s+[\dA-Z]+(?:\.\d+)*[:.]?)\s+[A-Z(]"
+)
+PAGE_NUMBER_RE = re.compile(r"^(?:page\s+)?[\divxlcIVXLC]{1,6}$", re.IGNORECASE)
+TABLE_ROW_RE = re.compile(r"\S\s{2,}\S|\t")
+NUMBER_RE = re.compile(r"^[-+±−–]?\d[\d.,%–-]*$")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def is_heading(line):
+    if len(line) > MAX_HEADING_CHARS or line.endswith((".", ",", ";")):
+        return False
+    if HEADING_RE.match(line):
+        return True
+    # All-caps titles ("SUMMARY FOR POLICYMAKERS"), not codes like "SSP5-8.5"
+    words = line.split()
+    return (any(len(w) >= 4 and w.isalpha() for w in words)
+            and all(c.isupper() for c in line if c.isalpha()))
+
+
+def is_table_row(line):
+    if TABLE_ROW_RE.search(line):
+        return True
+    tokens = line.split()
+    numeric = sum(1 for t in tokens if NUMBER_RE.match(t))
+    return len(tokens) >= 3 and numeric >= len(tokens) / 2
+
+
+def repeated_lines(pages):
+    """Running headers and footers: first or last lines repeated on many pages."""
+    if len(pages) < REPEATED_LINE_PAGES:
+        return set()
+    edges = Counter()
+    for lines in pages:
+        edges.update({line for line in lines[:2] + lines[-2:]})
+    return {line for line, n in edges.items() if n >= max(REPEATED_LINE_PAGES, len(pages) // 2)}
+
+
+def page_units(lines):
+    """(kind, text) units of one page: headings, tables (consecutive rows kept
+    together) and sentences of the running text."""
+    units = []
+    paragraph = []
+    table = []
+
+    def flush_paragraph():
+        if paragraph:
+            text = ""
+            for line in paragraph:
+                # Keep hyphens of wrapped words ("SSP5-" / "8.5"), drop the line break
+                text += line if text.endswith("-") or not text else " " + line
+            units.extend(("text", s) for s in SENTENCE_RE.split(text) if s.strip())
+            paragraph.clear()
+
+    def flush_table():
+        if table:
+            units.append(("table", "\n".join(table)))
+            table.clear()
+
+    for line in lines:
+        if is_heading(line):
+            flush_paragraph()
+            flush_table()
+            units.append(("heading", line))
+        elif is_table_row(line):
+            flush_paragraph()
+            table.append(line)
+        else:
+            flush_table()
+            paragraph.append(line)
+    flush_paragraph()
+    flush_table()
+    return units
+
+
+def split_oversized(text, max_tokens, counter):
+    """Cut a unit longer than the budget into word windows of at most ``max_tokens``."""
+    pieces = []
+    words = []
+    tokens = 0
+    for word in text.split(" "):
+        # Per-word counts overestimate; recount the piece only when near the budget
+        n = counter.count(" " + word)
+        if words and tokens + n > max_tokens:
+            tokens = counter.count(" ".join(words + [word])) - n
+            if tokens + n > max_tokens:
+                pieces.append(" ".join(words))
+                words, tokens = [], 0
+        words.append(word)
+        tokens += n
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+
+class ChunkBuilder:
+    def __init__(self, metadata, max_tokens, counter):
+        self.metadata = metadata
+        self.max_tokens = max_tokens
+        self.counter = counter
+        self.chunks = []
+        self.parts = []  # (kind, text, page)
+        self.tokens = 0
+        self.section = None
+
+    def flush(self):
+        # Heading-only parts stay to open the next chunk
+        if self.parts and any(kind != "heading" for kind, _, _ in self.parts):
+            metadata = dict(self.metadata)
+            metadata.update({"page": self.parts[0][2], "page_end": self.parts[-1][2],
+                             "section": self.section or "", "tokens": self.tokens})
+            text = "\n".join(text for _, text, _ in self.parts)
+            self.chunks.append(Document(page_content=text, metadata=metadata))
+            self.parts, self.tokens = [], 0
+
+    def add(self, kind, text, page):
+        tokens = self.counter.count(text)
+        if self.parts and self.tokens + tokens > self.max_tokens:
+            # Don't leave headings behind at the end of a chunk: they open the next one
+            headings = []
+            while self.parts and self.parts[-1][0] == "heading":
+                headings.insert(0, self.parts.pop())
+            heading_tokens = sum(self.counter.count(text) for _, text, _ in headings)
+            self.tokens -= heading_tokens
+            self.flush()
+            self.parts += headings
+            self.tokens += heading_tokens
+        self.parts.append((kind, text, page))
+        self.tokens += tokens
+
+
+def layout_split(docs, max_tokens=CHUNK_TOKENS, min_tokens=MIN_CHUNK_TOKENS, counter=None,
+                 section=None):
+    """Split the page documents of one PDF into section- and page-aligned chunks.
+
+    Chunks end at section headings and at page ends (unless the chunk is
+    still shorter than ``min_tokens``, then it continues onto the next page),
+    hold at most ``max_tokens`` tokens besides the heading opening them, never cut a sentence or a table row
+    unless it alone exceeds the budget, and don't overlap. Each chunk's
+    metadata gets ``page`` (first page), ``page_end``, ``section`` (the last
+    heading seen, starting from ``section``) and ``tokens``.
+    """
+    counter = counter or token_counter()
+    pages = [[line.strip() for line in doc.page_content.splitlines() if line.strip()]
+             for doc in docs]
+    noise = repeated_lines(pages)
+    builder = None
+    for doc, lines in zip(docs, pages):
+        page = doc.metadata.get("page", 0)
+        metadata = {k: v for k, v in doc.metadata.items() if k not in ("page", "page_label")}
+        if builder is None:
+            builder = ChunkBuilder(metadata, max_tokens, counter)
+            builder.section = section
+        elif builder.tokens >= min_tokens:
+            builder.flush()
+
+        lines = [line for line in lines if line not in noise and not PAGE_NUMBER_RE.match(line)]
+        for kind, text in page_units(lines):
+            if kind == "heading":
+                builder.flush()
+                builder.section = text
+            if counter.count(text) > max_tokens:
+                for piece in split_oversized(text, max_tokens, counter):
+                    builder.add(kind, piece, page)
+            else:
+                builder.add(kind, text, page)
+    if builder is None:
+        return []
+    builder.flush()
+    return builder.chunks
+
+
+def section_index(chunks):
+    """Side index of a layout-chunked PDF: each section with its page range,
+    token count and the IDs of its chunks, in document order."""
+    sections = []
+    for chunk in chunks:
+        meta = chunk["metadata"]
+        if not sections or sections[-1]["section"] != meta["section"]:
+            sections.append({"section": meta["section"], "page_start": meta["page"],
+                             "page_end": meta["page_end"], "tokens": 0, "chunks": []})
+        entry = sections[-1]
+        entry["page_end"] = max(entry["page_end"], meta["page_end"])
+        entry["tokens"] += meta["tokens"]
+        entry["chunks"].append(chunk_id(chunk["page_content"], meta))
+    return sections
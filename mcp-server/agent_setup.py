@@ -1,91 +1,639 @@
 import asyncio
+import atexit
+import contextvars
+import os
+import re
+import threading
+from contextlib import asynccontextmanager
+from collections import OrderedDict, deque
+from itertools import islice
+import anyio
+import httpx
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
 from langchain_ollama import OllamaLLM
 from langchain_classic.agents import create_react_agent, AgentExecutor
+from langchain_classic.agents.agent import MultiActionAgentOutputParser, RunnableMultiActionAgent
 from langchain_classic.prompts import PromptTemplate
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tools import render_text_description
 import time
 from langchain_classic.tools import Tool
 import json
 
-# Global storage for tool calls
-TOOL_CALLS_HISTORY = []
+MCP_CONNECTIONS = {
+    "budget": {"transport": "sse", "url": "http://localhost:3333/sse"},
+    "destination": {"transport": "sse", "url": "http://localhost:3334/sse"},
+    "weather": {"transport": "sse", "url": "http://localhost:3335/sse"},
+    "currency": {"transport": "sse", "url": "http://localhost:3336/sse"},
+    "calculator": {"transport": "sse", "url": "http://localhost:3337/sse"}
+}
+# Where the tools run: "separate" (the five servers above), "host" (all of them
+# in tool_host.py, one SSE connection) or "inprocess" (tool_host imported here, no HTTP)
+MCP_HOST = os.getenv("AGENT_MCP_HOST", "separate")
+HOST_CONNECTIONS = {
+    "host": {"travel": {"transport": "sse", "url": "http://localhost:3330/sse"}},
+    "inprocess": {"travel": {"transport": "inprocess"}},
+}
+CONNECT_TIMEOUT = 10  # seconds to open one MCP session
+# Let the agent request several independent tool calls per step, run concurrently
+PARALLEL_TOOLS = os.getenv("AGENT_PARALLEL_TOOLS", "0") == "1"
+TOOL_CACHE_ENTRIES = 1024
+DEFAULT_CACHE_TTL = 300  # seconds, for read-only idempotent tools that declare no cache_ttl
+# Per-tool TTL overrides in seconds (0 disables caching), e.g. '{"get_weather_forecast": 600}'
+TOOL_CACHE_TTLS = json.loads(os.getenv("AGENT_TOOL_CACHE_TTLS", "{}"))
+TRACE_MAX_CALLS = 256  # tool calls kept per run; older ones are dropped
+LLM_MODEL = "llama3.2:1b"
+# Keep the model loaded with a fixed context size: Ollama then reuses the KV
+# cache of the prompt prefix that is unchanged since the previous request
+LLM_KEEP_ALIVE = os.getenv("AGENT_KEEP_ALIVE", "30m")
+LLM_NUM_CTX = int(os.getenv("AGENT_NUM_CTX", "4096"))
+OBSERVATION_MAX_CHARS = int(os.getenv("AGENT_OBSERVATION_CHARS", "600"))
 
-def track_tool_call(tool_name, tool_input, tool_output):
+
+class ToolTrace:
+    """Tool calls of one agent run, kept in a bounded ring buffer.
+
+    The agent records into it from the background loop while the UI reads
+    it from its own thread: every call gets a sequence number, and
+    ``since(seq)`` returns only the calls recorded after ``seq``.
+    """
+
+    def __init__(self, max_calls=TRACE_MAX_CALLS):
+        self._calls = deque(maxlen=max_calls)
+        self._lock = threading.Lock()
+        self.total = 0  # calls recorded, including those dropped from the buffer
+        self.llm_calls = deque(maxlen=max_calls)  # one entry per agent iteration
+        self.started = time.time()
+        self.finished = None
+
+    def record(self, call_data):
+        with self._lock:
+            self.total += 1
+            call_data['seq'] = self.total
+            self._calls.append(call_data)
+
+    def record_llm(self, usage):
+        with self._lock:
+            usage['iteration'] = len(self.llm_calls) + 1
+            self.llm_calls.append(usage)
+
+    def since(self, seq=0):
+        """Calls recorded after sequence number ``seq`` (still in the buffer)"""
+        with self._lock:
+            start = max(0, len(self._calls) - (self.total - seq))
+            return list(islice(self._calls, start, None))
+
+    def calls(self):
+        return self.since(0)
+
+    @property
+    def dropped(self):
+        return self.total - len(self._calls)
+
+    def finish(self):
+        self.finished = time.time()
+
+    def summary(self):
+        with self._lock:
+            calls = list(self._calls)
+            llm_calls = list(self.llm_calls)
+        return {
+            'calls': self.total,
+            'dropped': self.dropped,
+            'cached': sum(1 for c in calls if c.get('cached')),
+            'tool_ms': round(sum(c.get('duration_ms', 0) for c in calls), 2),
+            'input_bytes': sum(c['input_bytes'] for c in calls),
+            'output_bytes': sum(c['output_bytes'] for c in calls),
+            'llm_calls': len(llm_calls),
+            'prompt_tokens': sum(u['prompt_tokens'] or 0 for u in llm_calls),
+            'prompt_tokens_per_iteration': [u['prompt_tokens'] for u in llm_calls],
+            'running': self.finished is None,
+        }
+
+
+class LLMUsageRecorder(BaseCallbackHandler):
+    """Records each agent iteration's prompt size and Ollama's prompt_eval_count,
+    the prompt tokens it actually evaluated (those past the cached prefix)"""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = (time.perf_counter(), sum(len(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, prompt_chars = self._started.pop(run_id, (time.perf_counter(), 0))
+        generations = response.generations[0] if response.generations else []
+        info = (generations[0].generation_info if generations else None) or {}
+        self.trace.record_llm({
+            'prompt_chars': prompt_chars,
+            'prompt_tokens': info.get('prompt_eval_count'),
+            'prompt_eval_ms': round((info.get('prompt_eval_duration') or 0) / 1e6, 2),
+            'completion_tokens': info.get('eval_count'),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+        })
+
+
+# Trace of the agent run in progress; tool calls of that run (also those
+# run concurrently in other tasks) inherit it from the run's context
+_current_trace = contextvars.ContextVar("tool_trace", default=None)
+
+def use_trace(trace):
+    """Record the tool calls of the current task (and the tasks it starts) in ``trace``"""
+    _current_trace.set(trace)
+
+def track_tool_call(tool_name, tool_input, tool_output, seconds=None, cached=None):
     """Simple function to track tool calls"""
+    output = str(tool_output)
     call_data = {
         'tool': tool_name,
         'input': tool_input,
-        'output': str(tool_output)[:1000],  # Limit output length
-        'timestamp': time.time()
+        'output': output[:1000],  # Limit output length
+        'timestamp': time.time(),
+        'input_bytes': len(json.dumps(tool_input, default=str).encode()),
+        'output_bytes': len(output.encode())
     }
-    TOOL_CALLS_HISTORY.append(call_data)
-    print(f"🔧 Tool used: {tool_name} with input: {tool_input}")
+    if seconds is not None:
+        call_data['duration_ms'] = round(seconds * 1000, 2)
+    if cached is not None:
+        call_data['cached'] = cached
+        call_data['cache_hit_rate'] = TOOL_CACHE.hit_rate(tool_name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(call_data)
+    print(f"🔧 Tool used: {tool_name} with input: {tool_input}" + (" (cached)" if cached else ""))
     return call_data
 
-def get_tool_calls():
-    """Get all tool calls"""
-    return TOOL_CALLS_HISTORY.copy()
+# Background event loop: it owns the MCP sessions and runs the agent, so
+# every call from Streamlit (or any other sync code) reuses the same
+# connections instead of opening new ones in a fresh event loop.
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_loop():
+    """Start (once) and return the background event loop"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mcp-agent-loop", daemon=True).start()
+    return _loop
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the background loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+
+def mcp_connections(mode=MCP_HOST):
+    if mode == "separate":
+        return MCP_CONNECTIONS
+    if mode not in HOST_CONNECTIONS:
+        raise ValueError(f"Unknown AGENT_MCP_HOST '{mode}', expected separate, host or inprocess")
+    return HOST_CONNECTIONS[mode]
+
+
+def is_connection_error(e):
+    """A broken session (server restarted, stream closed), not a failing request"""
+    if isinstance(e, BaseExceptionGroup):
+        return any(is_connection_error(inner) for inner in e.exceptions)
+    if isinstance(e, McpError):
+        return e.error.code == CONNECTION_CLOSED
+    return isinstance(e, (OSError, httpx.TransportError, anyio.ClosedResourceError,
+                          anyio.BrokenResourceError, anyio.EndOfStream))
+
+
+class MCPSessionPool:
+    """One long-lived MCP session per server, kept open on the background loop.
+
+    Each session is owned by a task that opens it and then waits until the
+    session is closed, so the SSE connection is entered and exited in the
+    same task. A call that fails on a broken connection reopens that
+    server's session once and is retried; concurrent failures of one
+    server reopen it only once.
+    """
+
+    def __init__(self, connections):
+        self.client = MultiServerMCPClient(connections=connections)
+        self.connections = connections
+        self.sessions = {}
+        self.tools = {}  # server name -> {tool name: LangChain tool bound to the session}
+        self._holders = {}  # server name -> (owner task, stop event)
+        self._reconnecting = {}  # server name -> lock serializing its reconnects
+
+    @asynccontextmanager
+    async def _session(self, name):
+        if self.connections[name]["transport"] == "inprocess":
+            # Imported on demand: only this mode loads the tool servers into the agent
+            from fastmcp import Client
+            from tool_host import host
+            async with Client(host) as client:
+                yield client.session
+        else:
+            async with self.client.session(name) as session:
+                yield session
+
+    async def _hold(self, name, ready, stop):
+        try:
+            async with self._session(name) as session:
+                ready.set_result(session)
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+
+    async def connect(self, name):
+        ready = asyncio.get_running_loop().create_future()
+        stop = asyncio.Event()
+        task = asyncio.create_task(self._hold(name, ready, stop))
+        try:
+            session = await asyncio.wait_for(asyncio.shield(ready), CONNECT_TIMEOUT)
+        except BaseException:
+            stop.set()
+            task.cancel()
+            raise
+        self._holders[name] = (task, stop)
+        self.sessions[name] = session
+        tools = await load_mcp_tools(session, server_name=name)
+        self.tools[name] = {tool.name: tool for tool in tools}
+
+    async def open(self):
+        await asyncio.gather(*(self.connect(name) for name in self.connections))
+
+    async def disconnect(self, name):
+        holder = self._holders.pop(name, None)
+        self.sessions.pop(name, None)
+        if holder:
+            task, stop = holder
+            stop.set()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def close(self):
+        await asyncio.gather(*(self.disconnect(name) for name in list(self._holders)))
+
+    def all_tools(self):
+        # In configuration order, not connection order, so the prompt is the same every run
+        return [(server, tool) for server in self.connections if server in self.tools
+                for tool in self.tools[server].values()]
+
+    async def call(self, server, tool_name, arguments):
+        """Call a tool; returns a ToolMessage whose status is "error" for tool errors"""
+        tool_call = {"type": "tool_call", "name": tool_name, "args": arguments, "id": tool_name}
+        session = self.sessions.get(server)
+        try:
+            return await self.tools[server][tool_name].ainvoke(tool_call)
+        except Exception as e:
+            # Tool errors come back as results; only a broken connection is retried
+            if not is_connection_error(e):
+                raise
+            await self.reconnect(server, session, e)
+            return await self.tools[server][tool_name].ainvoke(tool_call)
+
+    async def reconnect(self, name, failed_session, error):
+        async with self._reconnecting.setdefault(name, asyncio.Lock()):
+            # Another call may already have replaced the session that failed
+            if self.sessions.get(name) is not failed_session:
+                return
+            print(f"⚠️ MCP session '{name}' failed ({type(error).__name__}), reconnecting...")
+            await self.disconnect(name)
+            await self.connect(name)
+
+
+class ToolResultCache:
+    """LRU cache of tool results that expire after their tool's TTL.
+
+    Identical calls made while the first one is still running (e.g. the
+    same lookup requested twice in one parallel step) wait for it instead
+    of calling the server again. Hits and misses are counted per tool.
+    """
+
+    def __init__(self, max_entries=TOOL_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expiry time, result)
+        self._inflight = {}  # key -> future of the running call
+        self.counts = {}  # tool name -> [hits, misses]
+
+    def _count(self, tool_name, hit):
+        self.counts.setdefault(tool_name, [0, 0])[0 if hit else 1] += 1
+
+    def hit_rate(self, tool_name):
+        hits, misses = self.counts.get(tool_name, (0, 0))
+        return round(hits / (hits + misses), 3) if hits + misses else 0.0
+
+    def stats(self):
+        hits = sum(h for h, _ in self.counts.values())
+        misses = sum(m for _, m in self.counts.values())
+        return {
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "tools": {name: {"hits": h, "misses": m, "hit_rate": self.hit_rate(name)}
+                      for name, (h, m) in sorted(self.counts.items())},
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self.counts.clear()
+
+    async def get_or_call(self, tool_name, key, ttl, call):
+        """(result, cached) for ``key``; ``call()`` returns (result, cacheable) on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._count(tool_name, True)
+            return entry[1], True
+        if key in self._inflight:
+            self._count(tool_name, True)
+            return await asyncio.shield(self._inflight[key]), True
+
+        self._count(tool_name, False)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result, cacheable = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(result)
+        if cacheable:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result, False
+
+
+TOOL_CACHE = ToolResultCache()
+
+def get_cache_stats():
+    """Hit rates of the tool-result cache"""
+    return TOOL_CACHE.stats()
+
+def tool_cache_ttl(tool_obj):
+    """Seconds a tool's results may be reused: the client override, else the
+    server's cache_ttl meta, else DEFAULT_CACHE_TTL for tools annotated as
+    read-only and idempotent, else 0 (never cached)"""
+    if tool_obj.name in TOOL_CACHE_TTLS:
+        return float(TOOL_CACHE_TTLS[tool_obj.name])
+    metadata = tool_obj.metadata or {}
+    meta = metadata.get("_meta") or {}
+    if "cache_ttl" in meta:
+        return float(meta["cache_ttl"])
+    if metadata.get("readOnlyHint") and metadata.get("idempotentHint"):
+        return float(DEFAULT_CACHE_TTL)
+    return 0.0
+
+def normalize_arguments(arguments, properties):
+    """Canonical arguments, so equivalent calls share a cache entry: whitespace
+    in strings collapsed, numbers given as strings converted, 5.0 -> 5"""
+    normalized = {}
+    for name, value in arguments.items():
+        kind = properties.get(name, {}).get("type")
+        if isinstance(value, str):
+            value = " ".join(value.split())
+            if kind in ("integer", "number"):
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+        if (kind in ("integer", "number") and isinstance(value, float)
+                and value.is_integer()):
+            value = int(value)
+        normalized[name] = value
+    return normalized
+
+
+def parse_tool_input(tool_input, arg_names):
+    """Turn a ReAct "Action Input" into tool arguments: a JSON object is used
+    as is, anything else goes to the tool's only argument."""
+    if isinstance(tool_input, dict):
+        return tool_input
+    text = str(tool_input).strip().strip("`").strip()
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = text.strip('"\'')
+    if isinstance(value, dict):
+        return value
+    if len(arg_names) == 1:
+        return {arg_names[0]: value}
+    return {"input": value}
+
+
+def tool_result_text(result):
+    """Text of an MCP tool result (a list of content blocks) for the agent's observation"""
+    if isinstance(result, list):
+        return "\n".join(block.get("text", "") if isinstance(block, dict) else str(block)
+                         for block in result)
+    return result if isinstance(result, str) else str(result)
+
+
+def trim_observation(text, max_chars=OBSERVATION_MAX_CHARS):
+    """Observation as the agent sees it: whitespace collapsed and capped.
+    Each observation is trimmed once, when it is added, so the scratchpad
+    only grows at the end and its earlier part stays cacheable. A JSON list
+    (the result of a batch tool) keeps every item and only long text items
+    are capped, so no result of the batch is lost."""
+    text = " ".join(text.split())
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            return json.dumps([trim_observation(item, max_chars) if isinstance(item, str) else item
+                               for item in items], ensure_ascii=False, separators=(",", ":"))
+    return text if len(text) <= max_chars else text[:max_chars] + " …"
+
+
+def create_tool_wrapper(pool, server, tool_obj):
+    """Native async tool calling the pooled session, with a sync entry point
+    that runs on the background loop"""
+    arg_names = list(tool_obj.args)
+    ttl = tool_cache_ttl(tool_obj)
+
+    async def call(kwargs):
+        message = await pool.call(server, tool_obj.name, kwargs)
+        # Tool errors are returned to the agent but never cached
+        return tool_result_text(message.content), message.status != "error"
+
+    async def async_wrapper(tool_input=""):
+        kwargs = normalize_arguments(parse_tool_input(tool_input, arg_names), tool_obj.args)
+        start = time.perf_counter()
+        cached = None
+        try:
+            if ttl > 0:
+                key = json.dumps([tool_obj.name, kwargs], sort_keys=True)
+                result, cached = await TOOL_CACHE.get_or_call(
+                    tool_obj.name, key, ttl, lambda: call(kwargs))
+            else:
+                result, _ = await call(kwargs)
+        except Exception as e:
+            result = f"Tool error: {str(e)}"
+        track_tool_call(tool_obj.name, kwargs, result, time.perf_counter() - start, cached)
+        return trim_observation(result)
+
+    def sync_wrapper(tool_input=""):
+        return run_async(async_wrapper(tool_input))
+
+    return Tool(
+        name=tool_obj.name,
+        func=sync_wrapper,
+        coroutine=async_wrapper,
+        description=f"{tool_obj.description} Arguments: {json.dumps(tool_obj.args)}"
+    )
+
+
+REACT_PROMPT = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+PARALLEL_REACT_PROMPT = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
 
-def clear_tool_calls():
-    """Clear tool call history"""
-    TOOL_CALLS_HISTORY.clear()
+Use the following format:
 
-async def setup_agent():
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action 1: an action to take, should be one of [{tool_names}]
+Action 1 Input: the input to action 1
+Action 2: another action that does not need the result of action 1
+Action 2 Input: the input to action 2
+... (request every independent action you need at once, numbered 1, 2, 3, ...)
+Observation 1: the result of action 1
+Observation 2: the result of action 2
+... (this Thought/Action/Observation block can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+
+class MultiActionReActParser(MultiActionAgentOutputParser):
+    """Parses numbered ReAct actions ("Action 1:" / "Action 1 Input:", ...)
+    into a list of actions that AgentExecutor runs concurrently. A single
+    unnumbered Action/Action Input pair is accepted too."""
+
+    action_re: re.Pattern = re.compile(
+        r"Action\s*(\d*)\s*:[ \t]*(.*?)\s*\n\s*Action\s*\1\s*Input\s*:[ \t]*(.*?)"
+        r"(?=\n\s*Action\s*\d*\s*:|\n\s*Observation|\n\s*Final Answer:|\Z)",
+        re.DOTALL,
+    )
+
+    def parse(self, text):
+        matches = self.action_re.findall(text)
+        if matches:
+            # The whole step's log goes with the first action, see format_parallel_scratchpad
+            return [AgentAction(tool.strip(), tool_input.strip(), text if i == 0 else "")
+                    for i, (_, tool, tool_input) in enumerate(matches)]
+        if "Final Answer:" in text:
+            return AgentFinish({"output": text.rsplit("Final Answer:", 1)[-1].strip()}, text)
+        raise OutputParserException(
+            f"Could not parse LLM output: `{text}`",
+            observation="Invalid Format: Missing 'Action 1:' after 'Thought:'",
+            llm_output=text,
+            send_to_llm=True,
+        )
+
+    @property
+    def _type(self):
+        return "multi-action-react"
+
+
+def format_parallel_scratchpad(intermediate_steps):
+    """Scratchpad with one LLM step followed by the numbered observations of its actions"""
+    thoughts = ""
+    n = 0
+    for action, observation in intermediate_steps:
+        if action.log:
+            thoughts += action.log.rstrip() + "\n"
+            n = 0
+        n += 1
+        thoughts += f"Observation {n}: {observation}\n"
+    return thoughts + "Thought:" if thoughts else ""
+
+
+def create_parallel_react_agent(llm, tools, prompt):
+    """Like create_react_agent, but the LLM may request several actions per step"""
+    prompt = prompt.partial(
+        tools=render_text_description(list(tools)),
+        tool_names=", ".join([t.name for t in tools]),
+    )
+    runnable = (
+        RunnablePassthrough.assign(
+            agent_scratchpad=lambda x: format_parallel_scratchpad(x["intermediate_steps"]),
+        )
+        | prompt
+        | llm.bind(stop=["\nObservation"])
+        | MultiActionReActParser()
+    )
+    return RunnableMultiActionAgent(runnable=runnable)
+
+
+_pool = None
+_tools = None
+
+async def setup_tools():
+    """Open the MCP sessions once and return the wrapped tools (mock tools if that fails)"""
+    global _pool, _tools
+    if _tools is not None:
+        return _tools
     print("🔗 Setting up MCP connections (async)...")
     
-    # 1. Setup MultiServerMCPClient
     tools = []
     try:
-        connections = {
-            "budget": {"transport": "sse", "url": "http://localhost:3333/sse"},
-            "destination": {"transport": "sse", "url": "http://localhost:3334/sse"},
-            "weather": {"transport": "sse", "url": "http://localhost:3335/sse"},
-            "currency": {"transport": "sse", "url": "http://localhost:3336/sse"},
-            "calculator": {"transport": "sse", "url": "http://localhost:3337/sse"}
-        }
-        
-        print(f"✅ Configuring {len(connections)} connections")
+        connections = mcp_connections()
+        print(f"✅ Configuring {len(connections)} connections ({MCP_HOST})")
         
-        client = MultiServerMCPClient(connections=connections)
-        print("✅ MultiServerMCPClient created")
+        pool = MCPSessionPool(connections)
+        try:
+            await pool.open()
+        except BaseException:
+            await pool.close()
+            raise
+        _pool = pool
+        print(f"✅ {len(pool.sessions)} MCP sessions open")
         
-        # Get tools asynchronously
-        raw_tools = await client.get_tools()
+        raw_tools = pool.all_tools()
         print(f"📊 Successfully loaded {len(raw_tools)} raw tools")
         
-        # Convert async tools to sync tools with tracking
-        for tool in raw_tools:
-            # Create a sync wrapper that tracks calls
-            def create_tool_wrapper(tool_obj):
-                def sync_wrapper(**kwargs):
-                    try:
-                        # Try to call the tool synchronously
-                        result = tool_obj.run(kwargs)
-                        track_tool_call(tool_obj.name, kwargs, result)
-                        return result
-                    except Exception as e:
-                        # If sync fails, try async
-                        try:
-                            result = asyncio.run(tool_obj.arun(kwargs))
-                            track_tool_call(tool_obj.name, kwargs, result)
-                            return result
-                        except Exception as e2:
-                            error_msg = f"Tool error: {str(e2)}"
-                            track_tool_call(tool_obj.name, kwargs, error_msg)
-                            return error_msg
-                return sync_wrapper
-            
-            # Create the wrapped tool
-            wrapped_tool = Tool(
-                name=tool.name,
-                func=create_tool_wrapper(tool),
-                description=tool.description
-            )
-            tools.append(wrapped_tool)
-            print(f"  📦 {tool.name}: {tool.description[:60]}...")
+        for server, tool in raw_tools:
+            tools.append(create_tool_wrapper(pool, server, tool))
+            ttl = tool_cache_ttl(tool)
+            print(f"  📦 {tool.name}: {tool.description[:60]}..." + (f" (cached {ttl:.0f}s)" if ttl else ""))
             
     except Exception as e:
-        print(f"❌ MCP setup failed: {e}")
+        print(f"❌ MCP setup failed: {e!r}")
         
         # Fallback to simple mock tools
         print("⚠️ Creating mock tools...")
@@ -100,7 +648,8 @@ async def setup_agent():
         
         for name, desc in mock_tools_data:
             def create_mock_func(tool_name=name, tool_desc=desc):
-                def mock_func(**kwargs):
+                def mock_func(tool_input=""):
+                    kwargs = parse_tool_input(tool_input, [])
                     # Simulate different responses based on tool
                     if "budget" in tool_name:
                         result = f"Estimated budget: ${kwargs.get('days', 5) * 200} USD"
@@ -125,19 +674,32 @@ async def setup_agent():
         
         print(f"✅ Created {len(tools)} mock tools")
     
-    # 2. Initialize Ollama
+    _tools = tools
+    return tools
+
+def create_llm():
     print("\n🚀 Initializing Ollama...")
     try:
         llm = OllamaLLM(
-            model="llama3.2:1b",
+            model=LLM_MODEL,
             temperature=0.1,
             num_predict=512,
+            num_ctx=LLM_NUM_CTX,
+            keep_alive=LLM_KEEP_ALIVE,
         )
         print("🤖 Ollama initialized")
     except Exception as e:
         print(f"❌ Ollama error: {e}")
         from langchain_community.llms import Ollama
-        llm = Ollama(model="llama3.2:1b", temperature=0.1)
+        llm = Ollama(model=LLM_MODEL, temperature=0.1)
+    return llm
+
+async def setup_agent(llm=None, parallel=PARALLEL_TOOLS):
+    # 1. Open one long-lived session per MCP server
+    tools = await setup_tools()
+    
+    # 2. Initialize Ollama
+    llm = llm or create_llm()
     
     # 3. Create agent with CORRECT prompt template
     if tools and llm:
@@ -146,37 +708,21 @@ async def setup_agent():
             tool_names = ", ".join([tool.name for tool in tools])
             
             # Create the EXACT prompt template that create_react_agent expects
-            prompt = PromptTemplate.from_template(
-                """Answer the following questions as best you can. You have access to the following tools:
-
-{tools}
-
-Use the following format:
-
-Question: the input question you must answer
-Thought: you should always think about what to do
-Action: the action to take, should be one of [{tool_names}]
-Action Input: the input to the action
-Observation: the result of the action
-... (this Thought/Action/Action Input/Observation can repeat N times)
-Thought: I now know the final answer
-Final Answer: the final answer to the original input question
-
-Begin!
-
-Question: {input}
-Thought:{agent_scratchpad}"""
-            )
+            prompt = PromptTemplate.from_template(PARALLEL_REACT_PROMPT if parallel else REACT_PROMPT)
             
             print(f"📝 Creating agent with {len(tools)} tools...")
             print(f"📋 Available tools: {tool_names}")
             
             # Create the agent with the prompt
-            agent = create_react_agent(
-                llm=llm,
-                tools=tools,
-                prompt=prompt
-            )
+            if parallel:
+                print("⚡ Parallel tool calls enabled")
+                agent = create_parallel_react_agent(llm, tools, prompt)
+            else:
+                agent = create_react_agent(
+                    llm=llm,
+                    tools=tools,
+                    prompt=prompt
+                )
             
             agent_executor = AgentExecutor(
                 agent=agent,
@@ -201,35 +747,56 @@ Thought:{agent_scratchpad}"""
 
 # Global agent instance
 _agent_executor = None
+_setup_lock = None
 
-def run_travel_agent(user_request: str):
-    """Run the travel planning agent"""
-    global _agent_executor
-    
-    if _agent_executor is None:
-        print("Initializing agent...")
-        _agent_executor = asyncio.run(setup_agent())
-    
-    if not _agent_executor:
-        return "Agent not initialized"
-    
+async def get_agent():
+    """Create the agent (and its MCP sessions) once, on the background loop"""
+    global _agent_executor, _setup_lock
+    if _setup_lock is None:
+        _setup_lock = asyncio.Lock()
+    async with _setup_lock:
+        if _agent_executor is None:
+            print("Initializing agent...")
+            _agent_executor = await setup_agent()
+    return _agent_executor
+
+async def run_travel_agent_async(user_request: str, trace=None):
+    """Run the travel planning agent; must run on the background loop (see run_async).
+    Its tool calls are recorded in ``trace``"""
+    trace = trace if trace is not None else ToolTrace()
+    use_trace(trace)
+    try:
+        agent_executor = await get_agent()
+        if not agent_executor:
+            return "Agent not initialized"
+        return await _run_agent(agent_executor, user_request, trace)
+    finally:
+        trace.finish()
+
+async def _run_agent(agent_executor, user_request, trace):
     try:
         print(f"\n📝 Processing: {user_request}")
         print("-" * 40)
         
-        # Clear previous tool calls for this request
-        clear_tool_calls()
-        
         start_time = time.time()
-        result = _agent_executor.invoke({"input": user_request})
+        result = await agent_executor.ainvoke({"input": user_request},
+                                              config={"callbacks": [LLMUsageRecorder(trace)]})
         elapsed = time.time() - start_time
         
         print(f"\n✅ Response time: {elapsed:.2f}s")
-        print(f"🔧 Total tool calls: {len(get_tool_calls())}")
+        print(f"🔧 Total tool calls: {trace.total}")
         
         # Print tool call summary
-        for i, call in enumerate(get_tool_calls()):
-            print(f"  {i+1}. {call['tool']}")
+        for call in trace.calls():
+            print(f"  {call['seq']}. {call['tool']}" + (" (cached)" if call.get('cached') else ""))
+        for usage in list(trace.llm_calls):
+            evaluated = (f"{usage['prompt_tokens']} prompt tokens evaluated, "
+                         if usage['prompt_tokens'] is not None else "")
+            print(f"  🧮 Iteration {usage['iteration']}: {evaluated}{usage['prompt_chars']} chars sent, "
+                  f"{usage['duration_ms']:.0f} ms")
+        cache = get_cache_stats()
+        print(f"♻️ Tool cache: {cache['hits']} hits / {cache['misses']} misses "
+              f"(hit rate {cache['hit_rate']:.0%})")
         
         return result.get("output", "No output generated")
         
@@ -237,3 +804,27 @@ def run_travel_agent(user_request: str):
         error_msg = f"Error: {str(e)}"
         print(f"❌ {error_msg}")
         return error_msg
+
+def run_travel_agent(user_request: str, trace=None):
+    """Run the travel planning agent"""
+    return run_async(run_travel_agent_async(user_request, trace))
+
+def start_travel_agent(user_request: str, trace):
+    """Start the agent on the background loop without waiting; returns a
+    concurrent.futures.Future of the output. ``trace`` fills up as it runs"""
+    return asyncio.run_coroutine_threadsafe(run_travel_agent_async(user_request, trace), get_loop())
+
+def shutdown_agent():
+    """Close the MCP sessions and stop the background loop"""
+    global _loop, _pool, _agent_executor
+    if _loop is None:
+        return
+    if _pool is not None:
+        try:
+            run_async(_pool.close(), timeout=CONNECT_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ Closing MCP sessions failed: {e}")
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop, _pool, _agent_executor = None, None, None
+
+atexit.register(shutdown_agent)
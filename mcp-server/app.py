@@ -1,5 +1,5 @@
 import streamlit as st
-from agent_setup import run_travel_agent, get_tool_calls, clear_tool_calls
+from agent_setup import start_travel_agent, ToolTrace, get_cache_stats
 import time
 
 st.title("🌍 Agentic Travel Planner (MCP)")
@@ -9,6 +9,9 @@ if 'planning_done' not in st.session_state:
     st.session_state.planning_done = False
 if 'last_output' not in st.session_state:
     st.session_state.last_output = ""
+if 'trace' not in st.session_state:
+    # Tool calls of this session's last plan only (bounded, see ToolTrace)
+    st.session_state.trace = None
 
 # Input area
 st.subheader("📝 Describe Your Trip")
@@ -24,7 +27,23 @@ with col1:
     if st.button("🚀 Generate Plan", type="primary", use_container_width=True):
         if query:
             with st.spinner("Planning your trip..."):
-                output = run_travel_agent(query)
+                trace = ToolTrace()
+                st.session_state.trace = trace
+                future = start_travel_agent(query, trace)
+                # Show tool calls as they happen, reading only the new ones
+                live = st.empty()
+                lines = []
+                seen = 0
+                while True:
+                    done = future.done()
+                    for call in trace.since(seen):
+                        seen = call['seq']
+                        lines.append(f"🔧 {call['tool']} ({call.get('duration_ms', 0):.0f} ms)")
+                    live.markdown("  \n".join(lines))
+                    if done:
+                        break
+                    time.sleep(0.2)
+                output = future.result()
                 st.session_state.last_output = output
                 st.session_state.planning_done = True
                 st.rerun()
@@ -38,7 +57,7 @@ with col2:
 
 with col3:
     if st.button("🗑️ Clear All", use_container_width=True):
-        clear_tool_calls()
+        st.session_state.trace = None
         st.session_state.planning_done = False
         st.session_state.last_output = ""
         st.rerun()
@@ -46,7 +65,8 @@ with col3:
 # Show results
 if st.session_state.planning_done:
     # Show tool calls
-    tool_calls = get_tool_calls()
+    trace = st.session_state.trace
+    tool_calls = trace.calls() if trace else []
     if tool_calls:
         st.subheader("🔧 Tools Used During Planning")
         
@@ -54,15 +74,24 @@ if st.session_state.planning_done:
         tab1, tab2 = st.tabs(["📋 Tool Calls", "📊 Details"])
         
         with tab1:
-            for i, call in enumerate(tool_calls):
-                st.markdown(f"**Step {i+1}: {call['tool']}**")
+            cache = get_cache_stats()
+            if cache['hits'] + cache['misses']:
+                st.caption(f"♻️ Tool cache: {cache['hits']} hits, {cache['misses']} misses "
+                           f"(hit rate {cache['hit_rate']:.0%})")
+            summary = trace.summary()
+            st.caption(f"⏱️ {summary['calls']} calls, {summary['tool_ms']:.0f} ms in tools, "
+                       f"{summary['input_bytes']} B in / {summary['output_bytes']} B out"
+                       + (f" ({summary['dropped']} oldest not kept)" if summary['dropped'] else ""))
+            for call in tool_calls:
+                cached = " ♻️ cached" if call.get('cached') else ""
+                st.markdown(f"**Step {call['seq']}: {call['tool']}**{cached}")
                 st.text(f"Input: {call['input']}")
                 st.text(f"Output: {call['output'][:200]}...")
                 st.divider()
         
         with tab2:
-            for i, call in enumerate(tool_calls):
-                with st.expander(f"Step {i+1}: {call['tool']}"):
+            for call in tool_calls:
+                with st.expander(f"Step {call['seq']}: {call['tool']}"):
                     st.json(call)
     
     # Show travel plan
@@ -0,0 +1,174 @@
+"""Sequential vs parallel tool calls of the travel agent.
+
+Runs the travel-planning prompts through the agent twice, once with the
+one-action-per-step ReAct prompt and once with parallel tool calls
+(AGENT_PARALLEL_TOOLS), against the running MCP servers, and reports the
+wall time, LLM round trips, tool calls and prompt size per iteration
+(characters sent, and with Ollama the prompt tokens it had to evaluate
+beyond its cached prefix).
+
+By default the LLM is scripted: it requests the same lookups a planner
+would (budget, attractions, weather, currency) and answers after
+``--llm-latency`` seconds per round trip, so the numbers show what the
+orchestration costs without depending on what a small model decides to
+do. ``--model llama3.2:1b`` uses Ollama instead.
+
+    python bench_agent.py --llm-latency 0.8
+    python bench_agent.py --model llama3.2:1b --out agent.json
+    AGENT_KEEP_ALIVE=0 python bench_agent.py --model llama3.2:1b  # no prompt cache reuse
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.llms import LLM
+
+import agent_setup
+
+# The example prompt of app.py and variations of it
+PROMPTS = [
+    "I want to visit Barcelona for 5 days with a budget of $2000",
+    "Plan a 3 day trip to Paris in spring, I have 1200 euros",
+    "I'm going to Tokyo for 7 days in July with $3500, what should I expect?",
+    "Weekend in New York, 2 days, budget $900",
+]
+DESTINATIONS = ["Barcelona", "Paris", "Tokyo", "New York"]
+
+
+def plan_for(question):
+    """Independent lookups a planner makes for a trip question"""
+    destination = next((d for d in DESTINATIONS if d in question), "Barcelona")
+    days = re.search(r"(\d+)\s*days?", question)
+    amount = re.search(r"(\d{3,})", question)
+    days = int(days.group(1)) if days else 5
+    amount = float(amount.group(1)) if amount else 1000.0
+    return [
+        ("estimate_budget", {"destination": destination, "days": days}),
+        ("search_destination", {"destination": destination}),
+        ("get_weather_forecast", {"destination": destination, "date": "2025-07-01"}),
+        ("convert_currency", {"amount": amount, "from_currency": "USD", "to_currency": "EUR"}),
+    ]
+
+
+class ScriptedLLM(LLM):
+    """Stands in for the model: requests the planned tool calls, one per
+    step or all at once, then gives a final answer."""
+
+    latency: float = 0.0
+    parallel: bool = False
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def _respond(self, prompt):
+        question, _, scratchpad = prompt.rpartition("Question: ")[2].partition("\n")
+        plan = plan_for(question)
+        if self.parallel:
+            if "Observation 1:" in scratchpad:
+                return "I now know the final answer\nFinal Answer: Here is your travel plan."
+            return " I can look these up at once\n" + "\n".join(
+                f"Action {i}: {tool}\nAction {i} Input: {json.dumps(args)}"
+                for i, (tool, args) in enumerate(plan, 1))
+        done = scratchpad.count("Observation:")
+        if done >= len(plan):
+            return " I now know the final answer\nFinal Answer: Here is your travel plan."
+        tool, args = plan[done]
+        return f" I need {tool}\nAction: {tool}\nAction Input: {json.dumps(args)}"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+
+class RoundTripCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.llm_calls = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_calls += 1
+
+
+async def run_traced(executor, prompt, trace, counter):
+    agent_setup.use_trace(trace)
+    usage = agent_setup.LLMUsageRecorder(trace)
+    return await executor.ainvoke({"input": prompt}, config={"callbacks": [counter, usage]})
+
+
+def run_mode(parallel, args):
+    if args.model:
+        from langchain_ollama import OllamaLLM
+        llm = OllamaLLM(model=args.model, temperature=0.1, num_predict=512,
+                        num_ctx=agent_setup.LLM_NUM_CTX, keep_alive=agent_setup.LLM_KEEP_ALIVE,
+                        **({"base_url": args.ollama_url} if args.ollama_url else {}))
+    else:
+        llm = ScriptedLLM(latency=args.llm_latency, parallel=parallel)
+    executor = agent_setup.run_async(agent_setup.setup_agent(llm=llm, parallel=parallel))
+    executor.verbose = False
+    # Each mode starts cold; repeated prompts then show the tool-result cache at work
+    agent_setup.TOOL_CACHE.clear()
+
+    runs = []
+    for prompt in PROMPTS:
+        for _ in range(args.repeat):
+            trace = agent_setup.ToolTrace()
+            counter = RoundTripCounter()
+            start = time.perf_counter()
+            agent_setup.run_async(run_traced(executor, prompt, trace, counter))
+            runs.append({
+                "prompt": prompt,
+                "seconds": time.perf_counter() - start,
+                "llm_calls": counter.llm_calls,
+                "tool_calls": trace.total,
+                "prompt_chars": [u["prompt_chars"] for u in trace.llm_calls],
+                "prompt_tokens": [u["prompt_tokens"] for u in trace.llm_calls],
+            })
+    iterations = [u for r in runs for u in r["prompt_chars"]]
+    evaluated = [t for r in runs for t in r["prompt_tokens"] if t is not None]
+    return {
+        "parallel": parallel,
+        "median_seconds": statistics.median(r["seconds"] for r in runs),
+        "mean_llm_calls": statistics.mean(r["llm_calls"] for r in runs),
+        "mean_tool_calls": statistics.mean(r["tool_calls"] for r in runs),
+        "mean_prompt_chars": statistics.mean(iterations),
+        "mean_prompt_tokens": statistics.mean(evaluated) if evaluated else None,
+        "tool_cache": agent_setup.get_cache_stats(),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs parallel tool calls.")
+    parser.add_argument("--llm-latency", type=float, default=0.5,
+                        help="Seconds per round trip of the scripted LLM.")
+    parser.add_argument("--model", help="Use this Ollama model instead of the scripted LLM.")
+    parser.add_argument("--ollama-url", help="Ollama server for --model (default: its own default).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per prompt and mode.")
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = [run_mode(False, args), run_mode(True, args)]
+    for r in results:
+        print(f"  {'parallel' if r['parallel'] else 'sequential':<10} "
+              f"median {r['median_seconds']:.2f}s  LLM calls {r['mean_llm_calls']:.1f}  "
+              f"tool calls {r['mean_tool_calls']:.1f}  "
+              f"tool cache hit rate {r['tool_cache']['hit_rate']:.0%}  "
+              f"prompt/iteration {r['mean_prompt_chars']:.0f} chars"
+              + (f", {r['mean_prompt_tokens']:.0f} tokens evaluated"
+                 if r['mean_prompt_tokens'] is not None else ""))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    agent_setup.shutdown_agent()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Five MCP servers vs one tool host vs in-process tools.
+
+Starts each layout in turn (AGENT_MCP_HOST=separate: the five servers on
+ports 3333-3337; host: tool_host.py on 3330; inprocess: no server), opens
+the agent's session pool on it and calls every tool ``--calls`` times,
+bypassing the tool-result cache. Reports startup and connect time,
+per-call latency percentiles and the resident memory of the server
+processes, read from /proc (Linux only). For the in-process layout it is
+the growth of this process from loading the tools and opening the session.
+
+The ports must be free: stop any servers started by hand first.
+
+    python bench_tool_host.py --calls 200 --out tool_host.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+
+import agent_setup
+
+# The benchmark helpers live with the RAG scripts at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rag_metrics import percentile
+
+SERVERS = {
+    "separate": [("budget_mcp_server.py", 3333), ("destination_server.py", 3334),
+                 ("weather_server.py", 3335), ("currency_server.py", 3336),
+                 ("calculator_server.py", 3337)],
+    "host": [("tool_host.py", 3330)],
+    "inprocess": [],
+}
+# One call per tool, round-robin
+CALLS = [
+    ("estimate_budget", {"destination": "Paris", "days": 5}),
+    ("search_destination", {"destination": "Paris"}),
+    ("get_weather_forecast", {"destination": "Paris", "date": "2025-07-01"}),
+    ("get_seasonal_advice", {"destination": "Paris"}),
+    ("convert_currency", {"amount": 100, "from_currency": "USD", "to_currency": "EUR"}),
+    ("get_currency_info", {"destination": "Paris"}),
+    ("calculate", {"expression": "1200 * 1.2"}),
+    ("calculate_batch", {"expressions": ["120 * 5", "80 + 45.5", "2000 / 5"]}),
+    ("calculate_daily_budget", {"total_budget": 2000, "days": 5}),
+    ("calculate_with_tax", {"amount": 100, "tax_percentage": 20}),
+    ("split_cost", {"total_cost": 300, "people": 3}),
+    ("convert_currency_batch", {"amounts": [120, 80, 45.5], "from_currencies": "USD",
+                                "to_currencies": ["EUR", "GBP", "JPY"]}),
+    ("calculate_daily_budget_batch", {"total_budgets": [2000, 1200], "days": [5, 3]}),
+    ("calculate_with_tax_batch", {"amounts": [100, 250], "tax_percentages": 20}),
+    ("split_cost_batch", {"total_costs": [300, 90], "people": 3}),
+]
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_for_port(port, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server on port {port} exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start within {timeout}s")
+
+
+def start_servers(layout):
+    procs = []
+    for script, port in SERVERS[layout]:
+        procs.append((subprocess.Popen([sys.executable, script], stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL), port))
+    for proc, port in procs:
+        wait_for_port(port, proc)
+    return [proc for proc, _ in procs]
+
+
+async def call_tools(pool, calls):
+    tools = {tool.name: server for server, tool in pool.all_tools()}
+    latencies = []
+    for i in range(calls):
+        name, arguments = CALLS[i % len(CALLS)]
+        start = time.perf_counter()
+        result = await pool.call(tools[name], name, arguments)
+        latencies.append(time.perf_counter() - start)
+        if result.status == "error":
+            raise RuntimeError(f"{name} failed: {result.content}")
+    return latencies
+
+
+def run_layout(layout, calls):
+    own_rss = rss_kb(os.getpid())
+    start = time.perf_counter()
+    procs = start_servers(layout)
+    startup = time.perf_counter() - start
+    pool = agent_setup.MCPSessionPool(agent_setup.mcp_connections(layout))
+    try:
+        start = time.perf_counter()
+        agent_setup.run_async(pool.open())
+        connect = time.perf_counter() - start
+        latencies = agent_setup.run_async(call_tools(pool, calls))
+        server_rss = sum(rss_kb(proc.pid) for proc in procs)
+        if layout == "inprocess":
+            server_rss = rss_kb(os.getpid()) - own_rss
+    finally:
+        agent_setup.run_async(pool.close())
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+    return {
+        "layout": layout,
+        "processes": len(procs),
+        "connections": len(pool.connections),
+        "startup_s": startup,
+        "connect_s": connect,
+        "calls": calls,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+        "server_rss_mb": server_rss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MCP server layouts.")
+    parser.add_argument("--calls", type=int, default=200, help="Tool calls per layout.")
+    parser.add_argument("--layouts", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument("--out", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = []
+    for layout in args.layouts:
+        r = run_layout(layout, args.calls)
+        results.append(r)
+        print(f"  {layout:<10} {r['processes']} process(es)  startup {r['startup_s']:.2f}s  "
+              f"connect {1000 * r['connect_s']:.0f} ms  p50 {r['p50_ms']:.2f} ms  "
+              f"p95 {r['p95_ms']:.2f} ms  server RSS {r['server_rss_mb']:.0f} MB")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    agent_setup.shutdown_agent()
+
+
+if __name__ == "__main__":
+    main()
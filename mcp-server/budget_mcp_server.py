@@ -1,10 +1,12 @@
 # Replace the old mcp.server.fastapi import
 from fastmcp import FastMCP  # This is the correct import for v2.14.1
 
+from tool_hints import CACHEABLE, ONE_DAY
+
 # Create server with FastMCP class instead of MCPServer
 mcp = FastMCP("budget-tools")  # Changed from server = MCPServer("budget-tools")
 
-@mcp.tool()  # Changed from @server.tool()
+@mcp.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})  # Changed from @server.tool()
 def estimate_budget(destination: str, days: int) -> float:
     """Estimate travel budget in USD."""
     base_cost = 100
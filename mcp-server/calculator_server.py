@@ -1,43 +1,170 @@
 from fastmcp import FastMCP 
 import uvicorn
+import ast
+import operator
+from functools import lru_cache
+import numpy as np
+
+from tool_hints import CACHEABLE, ONE_DAY
 
 server = FastMCP("calculator-tools")
 
-@server.tool()
-def calculate(expression: str) -> float:
-    """Evaluate a mathematical expression."""
-    # Simple calculator - in production, use a safer evaluation method
+# Limits of the expression evaluator
+MAX_EXPRESSION_CHARS = 1000
+# Operators of one compiled expression; each takes at least one character, so
+# every expression within MAX_EXPRESSION_CHARS fits
+MAX_STEPS = 1000
+MAX_INT_BITS = 10000  # largest integer an operation may produce (~3000 digits)
+MAX_BATCH = 200  # expressions or amounts per batch call
+COMPILED_CACHE_SIZE = 1024
+SAFE_CHARS = "0123456789+-*/(). "
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def check_size(op, left, right):
+    """Refuse integer operations whose result would exceed MAX_INT_BITS,
+    before computing them (9**9**9 would otherwise run for a very long time)."""
+    if not (isinstance(left, int) and isinstance(right, int)):
+        return
+    if op is operator.pow:
+        bits = right * (abs(left).bit_length() - 1) if abs(left) > 1 and right > 0 else 0
+    elif op is operator.mul:
+        bits = left.bit_length() + right.bit_length()
+    else:
+        bits = max(left.bit_length(), right.bit_length()) + 1
+    if bits > MAX_INT_BITS:
+        raise ValueError("result too large")
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_expression(cleaned_expr):
+    """Parse an arithmetic expression into a postfix program of numbers and operators."""
+    if len(cleaned_expr) > MAX_EXPRESSION_CHARS:
+        raise ValueError(f"expression longer than {MAX_EXPRESSION_CHARS} characters")
+    # Same parser and error messages as eval(), which also ignores leading spaces
+    tree = compile(cleaned_expr.lstrip(" "), "<string>", "eval", ast.PyCF_ONLY_AST)
+    program = []
+    steps = 0
+    # Iterative post-order walk: "-" * 999 + "1" nests deeper than the recursion limit
+    pending = [(tree.body, False)]
+    while pending:
+        node, operands_done = pending.pop()
+        if operands_done:
+            steps += 1
+            if steps > MAX_STEPS:
+                raise ValueError(f"expression has more than {MAX_STEPS} steps")
+            ops = BINARY_OPS if isinstance(node, ast.BinOp) else UNARY_OPS
+            program.append(ops[type(node.op)])
+        elif isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            program.append(node.value)
+        elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+            pending += [(node, True), (node.right, False), (node.left, False)]
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+            pending += [(node, True), (node.operand, False)]
+        else:
+            raise ValueError(f"unsupported expression: {type(node).__name__}")
+    return tuple(program)
+
+
+def evaluate(program):
+    stack = []
+    for step in program:
+        if step is operator.pos or step is operator.neg:
+            stack.append(step(stack.pop()))
+        elif callable(step):
+            right = stack.pop()
+            left = stack.pop()
+            check_size(step, left, right)
+            stack.append(step(left, right))
+        else:
+            stack.append(step)
+    return stack[0]
+
+
+def calculate_expression(expression):
     try:
         # Remove any unsafe characters
-        safe_chars = "0123456789+-*/(). "
-        cleaned_expr = ''.join(c for c in expression if c in safe_chars)
-        
-        # Evaluate safely using eval (for educational purposes only)
-        # In production, use a safer alternative like ast.literal_eval for limited expressions
-        result = eval(cleaned_expr)
+        cleaned_expr = ''.join(c for c in expression if c in SAFE_CHARS)
+        result = evaluate(compile_expression(cleaned_expr))
         return float(result)
     except Exception as e:
         return f"Error calculating expression: {str(e)}"
 
-@server.tool()
+def batch_columns(*columns):
+    """Equal-length float arrays of batch arguments; a single value applies to all."""
+    arrays = np.broadcast_arrays(*(np.atleast_1d(np.asarray(c, dtype=float)) for c in columns))
+    if arrays[0].ndim != 1 or len(arrays[0]) > MAX_BATCH:
+        raise ValueError(f"Expected lists of at most {MAX_BATCH} values")
+    return arrays
+
+
+def rounded(values):
+    # Python's round, as the single-value tools, so both give the same amounts
+    return [round(value, 2) for value in values.tolist()]
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
+def calculate(expression: str) -> float:
+    """Evaluate a mathematical expression."""
+    return calculate_expression(expression)
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
+def calculate_batch(expressions: list[str]) -> list[float | str]:
+    """Evaluate several mathematical expressions at once, e.g. the daily costs
+    of an itinerary. Returns one result (or error message) per expression."""
+    if len(expressions) > MAX_BATCH:
+        raise ValueError(f"At most {MAX_BATCH} expressions per call")
+    return [calculate_expression(expression) for expression in expressions]
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
 def calculate_daily_budget(total_budget: float, days: int) -> float:
     """Calculate daily budget from total budget and number of days."""
     if days <= 0:
         return 0.0
     return round(total_budget / days, 2)
 
-@server.tool()
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
+def calculate_daily_budget_batch(total_budgets: list[float], days: list[int] | int) -> list[float]:
+    """Calculate the daily budget of several trips (or legs) at once."""
+    total_budgets, days = batch_columns(total_budgets, days)
+    daily = np.divide(total_budgets, days, out=np.zeros_like(total_budgets), where=days > 0)
+    return rounded(daily)
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
 def calculate_with_tax(amount: float, tax_percentage: float) -> float:
     """Calculate total amount including tax."""
     tax_amount = amount * (tax_percentage / 100)
     return round(amount + tax_amount, 2)
 
-@server.tool()
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
+def calculate_with_tax_batch(amounts: list[float], tax_percentages: list[float] | float) -> list[float]:
+    """Calculate several amounts including tax at once; one tax rate per amount or one for all."""
+    amounts, tax_percentages = batch_columns(amounts, tax_percentages)
+    return rounded(amounts + amounts * (tax_percentages / 100))
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
 def split_cost(total_cost: float, people: int) -> float:
     """Split total cost equally among people."""
     if people <= 0:
         return total_cost
     return round(total_cost / people, 2)
 
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
+def split_cost_batch(total_costs: list[float], people: list[int] | int) -> list[float]:
+    """Split several total costs at once; one number of people per cost or one for all."""
+    total_costs, people = batch_columns(total_costs, people)
+    shares = np.divide(total_costs, people, out=total_costs.copy(), where=people > 0)
+    # Like split_cost, a cost without people comes back unrounded
+    return [round(share, 2) if n > 0 else share
+            for share, n in zip(shares.tolist(), people.tolist())]
+
 if __name__ == "__main__":
     server.run(transport="sse", port=3337)
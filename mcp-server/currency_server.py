@@ -1,27 +1,86 @@
 from fastmcp import FastMCP 
 import uvicorn
+import numpy as np
+
+from tool_hints import CACHEABLE, FIFTEEN_MINUTES, ONE_DAY
 
 server = FastMCP("currency-tools")
 
-@server.tool()
+# Mock exchange rates - in production, use a real API like ExchangeRate-API
+# Units of each currency per US dollar; every other rate is derived from these
+USD_RATES = {"USD": 1.0, "EUR": 0.92, "GBP": 0.79, "JPY": 148.0}
+CURRENCIES = list(USD_RATES)
+CURRENCY_INDEX = {code: i for i, code in enumerate(CURRENCIES)}
+# Amounts in an unknown currency are taken as USD; an unknown target gets rate 1.0
+DEFAULT_SOURCE = CURRENCY_INDEX["USD"]
+UNKNOWN_TARGET = len(CURRENCIES)
+MAX_BATCH = 200  # amounts per convert_currency_batch call
+# The per-pair rates convert_currency used before they were derived from
+# USD_RATES; every derived rate must stay within RATE_TOLERANCE of them
+QUOTED_RATES = {
+    "USD": {"EUR": 0.92, "GBP": 0.79, "JPY": 148.0, "USD": 1.0},
+    "EUR": {"USD": 1.09, "GBP": 0.86, "JPY": 161.0, "EUR": 1.0},
+    "GBP": {"USD": 1.27, "EUR": 1.16, "JPY": 187.0, "GBP": 1.0},
+    "JPY": {"USD": 0.0068, "EUR": 0.0062, "GBP": 0.0053, "JPY": 1.0}
+}
+RATE_TOLERANCE = 0.01  # relative
+
+
+def cross_rate_matrix(usd_rates):
+    """CROSS_RATES[i, j]: units of currency j per unit of currency i, plus a
+    last column of 1.0 for unknown targets."""
+    rates = np.array(list(usd_rates.values()), dtype=float)
+    matrix = np.ones((len(rates), len(rates) + 1))
+    matrix[:, :len(rates)] = rates[np.newaxis, :] / rates[:, np.newaxis]
+    return matrix
+
+
+def check_rate_parity(matrix, quoted=QUOTED_RATES, tolerance=RATE_TOLERANCE):
+    """Raise ValueError if a derived rate drifts from the quoted rate of a pair."""
+    for source, targets in quoted.items():
+        for target, rate in targets.items():
+            derived = float(matrix[CURRENCY_INDEX[source], CURRENCY_INDEX[target]])
+            if abs(derived - rate) > tolerance * rate:
+                raise ValueError(f"{source}->{target}: derived rate {derived:.6g} "
+                                 f"differs from the quoted {rate} by more than {tolerance:.0%}")
+
+
+CROSS_RATES = cross_rate_matrix(USD_RATES)
+check_rate_parity(CROSS_RATES)  # at import, so a changed USD_RATES can't go unnoticed
+
+
+def currency_indices(codes, count, default):
+    """Matrix indices of currency codes; a single code applies to all ``count`` amounts."""
+    if isinstance(codes, str):
+        codes = [codes] * count
+    if len(codes) != count:
+        raise ValueError(f"Expected {count} currency codes, got {len(codes)}")
+    return np.array([CURRENCY_INDEX.get(code.upper(), default) for code in codes], dtype=int)
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": FIFTEEN_MINUTES})
 def convert_currency(amount: float, from_currency: str, to_currency: str) -> float:
     """Convert amount from one currency to another using current exchange rates."""
-    # Mock exchange rates - in production, use a real API like ExchangeRate-API
-    exchange_rates = {
-        "USD": {"EUR": 0.92, "GBP": 0.79, "JPY": 148.0, "USD": 1.0},
-        "EUR": {"USD": 1.09, "GBP": 0.86, "JPY": 161.0, "EUR": 1.0},
-        "GBP": {"USD": 1.27, "EUR": 1.16, "JPY": 187.0, "GBP": 1.0},
-        "JPY": {"USD": 0.0068, "EUR": 0.0062, "GBP": 0.0053, "JPY": 1.0}
-    }
-    
-    # Default to USD if currency not found
-    rates = exchange_rates.get(from_currency.upper(), exchange_rates["USD"])
-    rate = rates.get(to_currency.upper(), 1.0)
+    row = CURRENCY_INDEX.get(from_currency.upper(), DEFAULT_SOURCE)
+    column = CURRENCY_INDEX.get(to_currency.upper(), UNKNOWN_TARGET)
+    rate = float(CROSS_RATES[row, column])
     
     converted_amount = round(amount * rate, 2)
     return converted_amount
 
-@server.tool()
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": FIFTEEN_MINUTES})
+def convert_currency_batch(amounts: list[float], from_currencies: list[str] | str,
+                           to_currencies: list[str] | str) -> list[float]:
+    """Convert many amounts at once, e.g. every cost of a multi-country itinerary.
+    Give one currency code per amount, or a single code that applies to all."""
+    if len(amounts) > MAX_BATCH:
+        raise ValueError(f"At most {MAX_BATCH} amounts per call")
+    rows = currency_indices(from_currencies, len(amounts), DEFAULT_SOURCE)
+    columns = currency_indices(to_currencies, len(amounts), UNKNOWN_TARGET)
+    converted = np.asarray(amounts, dtype=float) * CROSS_RATES[rows, columns]
+    # Python's round, as convert_currency, so both tools give the same amounts
+    return [round(value, 2) for value in converted.tolist()]
+
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
 def get_currency_info(destination: str) -> str:
     """Get currency information for a specific destination."""
     currency_info = {
@@ -1,9 +1,11 @@
 from fastmcp import FastMCP 
 import uvicorn
 
+from tool_hints import CACHEABLE, ONE_DAY
+
 server = FastMCP("destination-search-tools")
 
-@server.tool()
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
 def search_destination(destination: str) -> str:
     """Search for tourist attractions, landmarks, and activities in a destination."""
     # In production, you'd connect to a real API like Google Places or Yelp
@@ -0,0 +1,11 @@
+"""Cache hints shared by the travel tool servers.
+
+Read-only tools are annotated with ``CACHEABLE`` and say in
+``meta={"cache_ttl": seconds}`` how long the agent may reuse their results
+(see agent_setup.tool_cache_ttl).
+"""
+CACHEABLE = {"readOnlyHint": True, "idempotentHint": True}
+
+FIFTEEN_MINUTES = 15 * 60
+ONE_HOUR = 3600
+ONE_DAY = 24 * 3600
@@ -0,0 +1,47 @@
+"""All travel tool sets in one FastMCP server.
+
+Mounts the budget, destination, weather, currency and calculator servers
+under a single host, so one process and one SSE connection replace the
+five servers on ports 3333-3337. Tool names, annotations and cache_ttl
+metadata are unchanged.
+
+    python tool_host.py                 # SSE on port 3330 (AGENT_MCP_HOST=host)
+
+With AGENT_MCP_HOST=inprocess the agent imports this module and talks to
+the host in memory instead, without any server process or HTTP.
+"""
+import argparse
+
+from fastmcp import FastMCP
+
+import budget_mcp_server
+import calculator_server
+import currency_server
+import destination_server
+import weather_server
+
+TOOL_HOST_PORT = 3330
+# In the order of the agent's separate connections, so the tool list stays the same
+TOOL_SERVERS = {
+    "budget": budget_mcp_server.mcp,
+    "destination": destination_server.server,
+    "weather": weather_server.server,
+    "currency": currency_server.server,
+    "calculator": calculator_server.server,
+}
+
+
+def create_host():
+    host = FastMCP("travel-tools")
+    for server in TOOL_SERVERS.values():
+        host.mount(server)  # no prefix: tool names stay as they are
+    return host
+
+
+host = create_host()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve all travel tools from one process.")
+    parser.add_argument("--port", type=int, default=TOOL_HOST_PORT)
+    args = parser.parse_args()
+    host.run(transport="sse", port=args.port)
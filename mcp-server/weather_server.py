@@ -2,9 +2,11 @@ from fastmcp import FastMCP
 import uvicorn
 from datetime import datetime, timedelta
 
+from tool_hints import CACHEABLE, ONE_DAY, ONE_HOUR
+
 server = FastMCP("weather-tools")
 
-@server.tool()
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_HOUR})
 def get_weather_forecast(destination: str, date: str) -> str:
     """
     Get weather forecast for a destination on a specific date.
@@ -54,7 +56,7 @@ def get_weather_forecast(destination: str, date: str) -> str:
     
     return f"Weather forecast for {destination} on {date}: {forecast}"
 
-@server.tool()
+@server.tool(annotations=CACHEABLE, meta={"cache_ttl": ONE_DAY})
 def get_seasonal_advice(destination: str) -> str:
     """Get general seasonal travel advice for a destination."""
     advice = {
@@ -0,0 +1,69 @@
+import os
+import asyncio
+
+from fastapi.concurrency import run_in_threadpool
+
+# ----- CONFIG -----
+MAX_BATCH = int(os.getenv("RAG_MICROBATCH_MAX", "32"))
+MAX_WAIT_MS = float(os.getenv("RAG_MICROBATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item calls into one call of a batch function.
+
+    ``await batcher.submit(item)`` parks the caller until either ``max_batch``
+    items are waiting or ``max_wait_ms`` has passed since the first one
+    arrived; then ``fn`` is called once, in a worker thread, with the list of
+    items and must return one result per item in the same order. Each caller
+    gets its own result back (or the exception if the batch failed).
+    """
+
+    def __init__(self, fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await run_in_threadpool(self.fn, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
@@ -1,16 +1,41 @@
+import os
+import sys
 import chromadb
+from chromadb.api.types import EmbeddingFunction
 from datetime import datetime
 
+# The embedding pipeline lives with the RAG scripts at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from embed_pipeline import OllamaEmbeddingPipeline
+from embed_cache import CachedEmbeddings, EmbeddingCache
+
+# Set MEMORY_EMBED_MODEL (e.g. "nomic-embed-text:latest") to embed memories
+# with Ollama; when unset Chroma's built-in embedding function is used.
+MEMORY_EMBED_MODEL = os.getenv("MEMORY_EMBED_MODEL")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+class PipelineEmbeddingFunction(EmbeddingFunction):
+    """Adapts a LangChain embeddings object to Chroma's embedding function interface."""
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def __call__(self, input):
+        return self.embeddings.embed_documents(list(input))
+
 class CustomerMemory:
-    def __init__(self):
+    def __init__(self, embedding_function=None):
         self.client = chromadb.Client()
+        kwargs = {}
+        if embedding_function is not None:
+            kwargs["embedding_function"] = embedding_function
         try:
             self.collection = self.client.create_collection(
                 name="customer_memory",
-                metadata={"description": "Customer conversation history"}
+                metadata={"description": "Customer conversation history"},
+                **kwargs
             )
         except:
-            self.collection = self.client.get_collection(name="customer_memory")
+            self.collection = self.client.get_collection(name="customer_memory", **kwargs)
     
     def store_conversation(self, user_id: str, conversation_summary: str, conversation_id: str):
         self.collection.add(
@@ -31,4 +56,10 @@ class CustomerMemory:
         return results
 
 # Initialize
-memory = CustomerMemory()
+memory = CustomerMemory(
+    PipelineEmbeddingFunction(CachedEmbeddings(
+        OllamaEmbeddingPipeline(model=MEMORY_EMBED_MODEL, base_url=OLLAMA_URL),
+        EmbeddingCache(MEMORY_EMBED_MODEL)
+    ))
+    if MEMORY_EMBED_MODEL else None
+)
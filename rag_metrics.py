@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# ----- CONFIG -----
+METRICS_DIR = os.getenv("RAG_METRICS_DIR", "metrics")  # .prom files of batch jobs
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def percentile(values, q):
+    """Nearest-rank ``q`` quantile (0 to 1) of ``values``, as the benchmarks report it."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Base of the minimal Prometheus metric types below (text format 0.0.4)."""
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [cumulative bucket counts, sum, count]
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {n}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+    def write_textfile(self, path):
+        """Write the metrics atomically, for node_exporter's textfile collector."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(path + ".tmp", path)
+
+
+# Metrics of the serving process, exposed by app.py at GET /metrics
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("rag_stage_seconds", "Time spent per request stage.", ["stage"])
+TOKENS = REGISTRY.counter("rag_tokens_total", "Tokens processed, by kind.", ["kind"])
+REQUESTS = REGISTRY.counter("rag_requests_total", "Answered requests.", ["endpoint", "cached"])
+
+
+class Timings:
+    """Per-request (or per-run) stage timings and token counts.
+
+    ``span(stage)`` times a block, ``mark(stage)`` records the time since the
+    start (e.g. the first token), ``count(kind, n)`` adds tokens. ``finish``
+    records the total, feeds the histogram and returns ``as_dict()``.
+    """
+
+    def __init__(self, histogram=STAGE_SECONDS, tokens=TOKENS):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.tokens = {}
+        self.histogram = histogram
+        self.token_counter = tokens
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def mark(self, stage):
+        self.stages[stage] = time.perf_counter() - self.start
+
+    def count(self, kind, n):
+        if n:
+            self.tokens[kind] = self.tokens.get(kind, 0) + int(n)
+
+    def finish(self):
+        self.stages["total"] = time.perf_counter() - self.start
+        if self.histogram is not None:
+            for stage, seconds in self.stages.items():
+                self.histogram.observe(seconds, stage=stage)
+        if self.token_counter is not None:
+            for kind, n in self.tokens.items():
+                self.token_counter.inc(n, kind=kind)
+        return self.as_dict()
+
+    def as_dict(self):
+        out = {f"{stage}_ms": round(1000 * seconds, 2) for stage, seconds in self.stages.items()}
+        out.update({f"{kind}_tokens": n for kind, n in self.tokens.items()})
+        return out
+
+
+def write_job_metrics(job, timings, counts, metrics_dir=METRICS_DIR):
+    """Record a finished batch run (ingest, embeddings) as ``<metrics_dir>/<job>.prom``
+    and print a one-line summary."""
+    registry = Registry()
+    stage = registry.gauge("rag_job_stage_seconds", "Duration of each stage of the last run.",
+                           ["job", "stage"])
+    items = registry.gauge("rag_job_items", "Items processed by the last run.", ["job", "kind"])
+    finished = registry.gauge("rag_job_last_success_timestamp_seconds",
+                              "When the last run finished.", ["job"])
+    summary = timings.finish()
+    for name, seconds in timings.stages.items():
+        stage.set(round(seconds, 6), job=job, stage=name)
+    for kind, n in {**counts, **timings.tokens}.items():
+        items.set(n, job=job, kind=kind)
+    finished.set(int(time.time()), job=job)
+    registry.write_textfile(os.path.join(metrics_dir, f"{job}.prom"))
+    print(f"{job} timings:", {**summary, **counts})
@@ -0,0 +1,177 @@
+import os
+import math
+import time
+import threading
+from collections import Counter, OrderedDict
+
+from bm25_index import doc_key, tokenize
+
+# ----- CONFIG -----
+RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+FETCH_N = int(os.getenv("RAG_RERANK_FETCH", "20"))  # Candidates retrieved before re-ranking
+BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "150"))
+BATCH_SIZE = 16  # (query, chunk) pairs scored per batch
+PROBE_SIZE = 4  # Pairs in the first batch, before the cost per pair is known
+CACHE_ENTRIES = int(os.getenv("RAG_RERANK_CACHE", "20000"))
+
+
+class CrossEncoderScorer:
+    """Scores pairs with a sentence-transformers cross-encoder on the CPU."""
+
+    name = "cross-encoder"
+    pairwise = True  # each pair is scored on its own, so scores can be cached
+
+    def __init__(self, model=RERANK_MODEL):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model, device="cpu")
+
+    def score(self, query, texts):
+        return [float(s) for s in self.model.predict([(query, t) for t in texts],
+                                                      batch_size=len(texts),
+                                                      show_progress_bar=False)]
+
+
+class LexicalScorer:
+    """Dependency-free fallback: saturated term overlap with the query,
+    weighted by how rare each query term is among the candidates, plus a
+    bonus for query terms appearing as one contiguous phrase."""
+
+    name = "lexical"
+    pairwise = False  # idf depends on the whole candidate set
+
+    def score(self, query, texts):
+        terms = set(tokenize(query))
+        if not terms:
+            return [0.0] * len(texts)
+        counts = [Counter(tokenize(t)) for t in texts]
+        df = {term: sum(1 for c in counts if term in c) for term in terms}
+        idf = {term: math.log(1 + (len(texts) + 1) / (df[term] + 0.5)) for term in terms}
+        phrase = " ".join(query.lower().split())
+        scores = []
+        for text, c in zip(texts, counts):
+            s = sum(idf[term] * 2 * c[term] / (c[term] + 1) for term in terms if c[term])
+            if len(phrase) > 3 and phrase in " ".join(text.lower().split()):
+                s += sum(idf.values())
+            scores.append(s)
+        return scores
+
+
+def load_scorer(model=RERANK_MODEL):
+    """The cross-encoder if sentence-transformers and the model are available, else lexical."""
+    try:
+        return CrossEncoderScorer(model)
+    except Exception as e:
+        print(f"Cross-encoder '{model}' unavailable ({type(e).__name__}); using the lexical re-ranker")
+        return LexicalScorer()
+
+
+class Reranker:
+    """Re-orders over-fetched candidates and keeps the best k.
+
+    Scores of a pairwise scorer are cached per (query, chunk ID), so only
+    unseen pairs are scored, in batches. Scorers whose scores depend on the
+    other candidates score the whole set at once, uncached.
+
+    A scoring call can't be interrupted, so the time per pair is tracked and
+    every call is sized to what is left of ``budget_ms``. When not even one
+    more pair (or, for a non-pairwise scorer, the whole set) is expected to
+    fit, the candidates are returned in their original (retrieval) order.
+    """
+
+    def __init__(self, scorer=None, budget_ms=BUDGET_MS, batch_size=BATCH_SIZE,
+                 cache_entries=CACHE_ENTRIES):
+        self.scorer = scorer or load_scorer()
+        self.budget = budget_ms / 1000
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.fallbacks = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.seconds = 0.0
+        self._pair_seconds = 0.0  # moving average; 0 until the first call
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, key, score):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def _affordable(self, start, unknown):
+        """How many pairs are expected to fit in what is left of the budget
+        (``unknown`` until a call has measured the cost per pair)."""
+        remaining = self.budget - (time.perf_counter() - start)
+        if remaining <= 0:
+            return 0
+        if not self._pair_seconds:
+            return unknown
+        return int(remaining / self._pair_seconds)
+
+    def _score(self, query, texts):
+        t = time.perf_counter()
+        scores = self.scorer.score(query, texts)
+        per_pair = (time.perf_counter() - t) / len(texts)
+        self._pair_seconds = (0.8 * self._pair_seconds + 0.2 * per_pair
+                              if self._pair_seconds else per_pair)
+        self.pairs_scored += len(texts)
+        return scores
+
+    def rerank(self, query, docs, k=4):
+        start = time.perf_counter()
+        self.calls += 1
+        if not docs:
+            return docs
+        if not self.scorer.pairwise:
+            if self._affordable(start, len(docs)) < len(docs):
+                return self._fallback(docs, k, start)
+            scores = self._score(query, [doc.page_content for doc in docs])
+            return self._top(docs, scores, k, start)
+
+        normalized = " ".join(query.lower().split())
+        keys = [(normalized, doc_key(doc)) for doc in docs]
+        scores = [self._cached(key) for key in keys]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        self.cache_hits += len(docs) - len(missing)
+
+        while missing:
+            # Checked before every call, with the cost of the calls so far
+            size = min(self.batch_size, self._affordable(start, PROBE_SIZE))
+            if size < 1:
+                return self._fallback(docs, k, start)
+            batch, missing = missing[:size], missing[size:]
+            for i, score in zip(batch, self._score(query, [docs[i].page_content for i in batch])):
+                scores[i] = score
+                self._store(keys[i], score)
+        return self._top(docs, scores, k, start)
+
+    def _fallback(self, docs, k, start):
+        self.fallbacks += 1
+        self.seconds += time.perf_counter() - start
+        return docs[:k]
+
+    def _top(self, docs, scores, k, start):
+        # Stable: ties keep retrieval order
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        self.seconds += time.perf_counter() - start
+        return [docs[i] for i in order[:k]]
+
+    def stats(self):
+        return {
+            "scorer": self.scorer.name,
+            "calls": self.calls,
+            "fallbacks": self.fallbacks,
+            "pairs_scored": self.pairs_scored,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self._cache),
+            "mean_ms": 1000 * self.seconds / self.calls if self.calls else 0.0,
+        }
@@ -0,0 +1,28 @@
+"""Serve the RAG app with several worker processes sharing one index.
+
+Every worker maps the same read-only index snapshot (RAG_BACKEND=numpy)
+and BM25 segments, so their pages live once in the OS page cache instead
+of once per process as with a Chroma client per worker. Publishing a new
+snapshot with ``python embeddings.py --export-index`` swaps it in without
+restarting the workers.
+
+    python serve.py --workers 4 --port 8000
+"""
+import os
+import argparse
+
+import uvicorn
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run app.py with shared-index workers.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backend", default=os.getenv("RAG_BACKEND", "numpy"),
+                        help="Retriever backend; 'chroma' opens one client per worker.")
+    args = parser.parse_args()
+
+    # Workers are separate processes; the settings reach them through the environment
+    os.environ["RAG_BACKEND"] = args.backend
+    os.environ["RAG_WORKERS"] = str(args.workers)
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,152 @@
+"""Minimal stand-in for an Ollama server, for offline runs and load tests.
+
+Implements /api/embed (and the legacy /api/embeddings) with deterministic
+feature-hashing vectors: texts sharing words get similar embeddings, so
+retrieval behaves sensibly without a real model. /api/chat and
+/api/generate answer with a fixed canned reply, streamed word by word when
+asked to. Latency and failure rate are configurable to exercise concurrency
+and retry logic.
+
+    python stub_ollama.py --port 11435 --latency 0.05 --fail-rate 0.1
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_RE = re.compile(r"\w+(?:[.\-]\w+)*")
+
+
+def stub_embedding(text, dim):
+    vec = [0.0] * dim
+    for token in TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+STUB_ANSWER = ("This is a stub answer generated without a language model. "
+               "It has a fixed length so latency measurements are comparable.")
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    config = None  # set by serve()
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_ndjson(self, lines):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            data = json.dumps(line).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _generate(self, body, prompt_chars, wrap):
+        """Answer a chat/generate request; ``wrap`` turns a text piece into the response field."""
+        cfg = self.config
+        words = STUB_ANSWER.split(" ")
+        stats = {
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": prompt_chars // 4,
+            "eval_count": len(words),
+        }
+        model = body.get("model", "stub")
+        if not body.get("stream", True):
+            time.sleep(cfg.token_latency * len(words))
+            self._send_json(200, {"model": model, **wrap(STUB_ANSWER), **stats})
+            return
+
+        def lines():
+            for i, word in enumerate(words):
+                time.sleep(cfg.token_latency)
+                yield {"model": model, **wrap(word if i == 0 else " " + word), "done": False}
+            yield {"model": model, **wrap(""), **stats}
+        self._send_ndjson(lines())
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "stub"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self._read_json()
+        cfg = self.config
+        if cfg.latency:
+            time.sleep(cfg.latency)
+        if cfg.fail_rate and random.random() < cfg.fail_rate:
+            self._send_json(503, {"error": "stub: injected failure"})
+            return
+
+        if self.path == "/api/embed":
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self._send_json(200, {
+                "model": body.get("model", "stub"),
+                "embeddings": [stub_embedding(t, cfg.dim) for t in inputs],
+            })
+        elif self.path == "/api/embeddings":
+            self._send_json(200, {"embedding": stub_embedding(body.get("prompt", ""), cfg.dim)})
+        elif self.path == "/api/chat":
+            prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+            self._generate(body, prompt_chars,
+                           lambda text: {"message": {"role": "assistant", "content": text}})
+        elif self.path == "/api/generate":
+            self._generate(body, len(body.get("prompt", "")), lambda text: {"response": text})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+def serve(host="127.0.0.1", port=11435, dim=256, latency=0.0, token_latency=0.0,
+          fail_rate=0.0, verbose=False):
+    config = argparse.Namespace(dim=dim, latency=latency, token_latency=token_latency,
+                                fail_rate=fail_rate, verbose=verbose)
+    handler = type("Handler", (StubOllamaHandler,), {"config": config})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to sleep before answering each request.")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Seconds per generated word on /api/chat and /api/generate.")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.dim, args.latency, args.token_latency,
+                   args.fail_rate, args.verbose)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}")
+    server.serve_forever()
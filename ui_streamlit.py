@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 
@@ -5,22 +6,43 @@ st.title("RAG demo — IPCC AR6 (Ollama + LangChain)")
 
 q = st.text_input("Ask a question about the IPCC reports")
 
+
+def iter_events(resp):
+    """Parse a server-sent event stream into (event, data) pairs."""
+    event, data = None, []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
+
+
 if st.button("Ask") and q:
     resp = requests.post(
-        "http://localhost:8000/ask",
-        json={"question": q}
+        "http://localhost:8000/ask/stream",
+        json={"question": q},
+        stream=True
     )
 
     if resp.ok:
-        data = resp.json()
         st.subheader("Answer")
-        st.write(data["ans"])
-
+        answer_box = st.empty()
         st.subheader("Sources")
-        for s in data["sources"]:
-            st.write(f"Page {s['page']}: {s['content']}...")
-	
+        sources_box = st.container()
+
+        answer = ""
+        for event, data in iter_events(resp):
+            if event == "sources":
+                for s in data:
+                    sources_box.write(f"Page {s['page']}: {s['content']}...")
+            elif event == "token":
+                answer += data
+                answer_box.write(answer)
+            elif event == "error":
+                st.error("API error: " + data["detail"])
 
     else:
         st.error("API error: " + str(resp.status_code))
-
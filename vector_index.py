@@ -0,0 +1,426 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from chunk_store import RecordTable, write_record_table
+
+# ----- CONFIG -----
+INDEX_DIR = "index"
+EXPORT_BATCH = 5000  # Rows read from Chroma per call when exporting
+NPROBE = 8  # IVF lists scanned per query (of ~sqrt(N) lists)
+REFINE = 4  # Quantized mode re-scores k * REFINE candidates exactly
+CURRENT_FILE = "CURRENT"  # Names the published snapshot directory
+KEEP_SNAPSHOTS = 2  # Published snapshots kept on disk (current + previous)
+
+
+def _metric_of(vectordb):
+    metadata = vectordb._collection.metadata or {}
+    return metadata.get("hnsw:space", "l2")
+
+
+def _kmeans(x, k, iters=10, seed=0, sample_size=50000):
+    """Plain Lloyd's k-means on (a sample of) unit-normalized rows, by inner product."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(x), min(len(x), sample_size), replace=False)
+    sample = _normalize(np.asarray(x[np.sort(rows)], dtype=np.float32))
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for j in range(k):
+            members = sample[assign == j]
+            if len(members):
+                centroids[j] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def _assign(x, centroids, batch=65536):
+    out = np.empty(len(x), dtype=np.int32)
+    for i in range(0, len(x), batch):
+        block = _normalize(np.asarray(x[i:i + batch], dtype=np.float32))
+        out[i:i + batch] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def build_ivf(index_dir, nlist=None):
+    """Add an IVF layout with int8-quantized vectors to an exported index."""
+    vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+    n = len(vectors)
+    nlist = nlist or max(1, int(np.sqrt(n)))
+    nlist = min(nlist, n)
+
+    centroids = _kmeans(vectors, nlist)
+    assign = _assign(vectors, centroids)
+    order = np.argsort(assign, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+
+    # Rows in list order, quantized to int8 with one scale per row
+    codes = np.lib.format.open_memmap(os.path.join(index_dir, "ivf_codes.npy"), mode="w+",
+                                      dtype=np.int8, shape=vectors.shape)
+    scales = np.empty(n, dtype=np.float32)
+    for i in range(0, n, 65536):
+        block = np.asarray(vectors[order[i:i + 65536]], dtype=np.float32)
+        s = np.abs(block).max(axis=1) / 127
+        s[s == 0] = 1
+        codes[i:i + 65536] = np.round(block / s[:, None]).astype(np.int8)
+        scales[i:i + 65536] = s
+    codes.flush()
+
+    np.save(os.path.join(index_dir, "ivf_centroids.npy"), centroids)
+    np.save(os.path.join(index_dir, "ivf_order.npy"), order)
+    np.save(os.path.join(index_dir, "ivf_offsets.npy"), offsets)
+    np.save(os.path.join(index_dir, "ivf_scales.npy"), scales)
+    return nlist
+
+
+def export_index(vectordb, index_dir=INDEX_DIR, ivf=True, batch_size=EXPORT_BATCH):
+    """Dump a Chroma collection into a read-only NumPy index directory.
+
+    Layout: ``vectors.npy`` (float32, one row per chunk; unit-normalized for
+    the cosine metric), ``sqnorms.npy`` (for l2), ``docs.jsonl`` +
+    ``doc_offsets.npy`` (chunk id, text and metadata per row) and
+    ``meta.json``. With ``ivf`` the approximate-search files are added too.
+    """
+    start = time.perf_counter()
+    os.makedirs(index_dir, exist_ok=True)
+    metric = _metric_of(vectordb)
+    n = vectordb._collection.count()
+    if not n:
+        raise ValueError("The vector store is empty; run embeddings.py first")
+
+    vectors = None
+    rows = 0
+
+    def records():
+        nonlocal vectors, rows
+        for offset in range(0, n, batch_size):
+            page = vectordb.get(include=["embeddings", "documents", "metadatas"],
+                                limit=batch_size, offset=offset)
+            block = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(index_dir, "vectors.npy"),
+                                                    mode="w+", dtype=np.float32,
+                                                    shape=(n, block.shape[1]))
+            if metric == "cosine":
+                block = _normalize(block)
+            vectors[rows:rows + len(block)] = block
+            rows += len(block)
+            for doc_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                yield {"id": doc_id, "page_content": text, "metadata": metadata or {}}
+
+    offsets = write_record_table(os.path.join(index_dir, "docs.jsonl"), records())
+    vectors.flush()
+    np.save(os.path.join(index_dir, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(index_dir, "sqnorms.npy"), np.einsum("ij,ij->i", vectors, vectors))
+
+    meta = {"count": rows, "dim": int(vectors.shape[1]), "metric": metric, "nlist": None}
+    if ivf:
+        meta["nlist"] = build_ivf(index_dir)
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    print(f"Exported {rows} vectors to '{index_dir}' in {time.perf_counter() - start:.1f}s "
+          f"(metric={metric}, nlist={meta['nlist']})")
+    return meta
+
+
+def current_snapshot(index_root=INDEX_DIR):
+    """Directory of the snapshot ``CURRENT`` points to, or ``index_root``
+    itself for an index exported directly into it."""
+    try:
+        with open(os.path.join(index_root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return os.path.join(index_root, f.read().strip())
+    except FileNotFoundError:
+        return index_root
+
+
+def publish_snapshot(vectordb, index_root=INDEX_DIR, ivf=True, keep=KEEP_SNAPSHOTS):
+    """Export a new immutable snapshot and switch ``CURRENT`` to it atomically.
+
+    Servers keep answering from the previous snapshot until they see the new
+    pointer; snapshots beyond the ``keep`` most recent are deleted.
+    """
+    os.makedirs(index_root, exist_ok=True)
+    now = time.time_ns()
+    # Names sort by publication time (UTC, so DST and timezone changes can't reorder them)
+    name = time.strftime("snap-%Y%m%dT%H%M%S", time.gmtime(now // 10**9)) + f".{now % 10**9:09d}"
+    tmp = os.path.join(index_root, name + ".tmp")
+    meta = export_index(vectordb, tmp, ivf=ivf)
+    os.replace(tmp, os.path.join(index_root, name))
+
+    pointer = os.path.join(index_root, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    snapshots = sorted(entry for entry in os.listdir(index_root)
+                       if entry.startswith("snap-") and not entry.endswith(".tmp"))
+    for old in snapshots[:-keep]:
+        if old == name:
+            continue
+        # Processes that still map an old snapshot keep their pages until they reload
+        shutil.rmtree(os.path.join(index_root, old), ignore_errors=True)
+    print(f"Published snapshot '{name}'")
+    return meta
+
+
+class NumpyVectorIndex(VectorStore):
+    """Read-only vector store over an index exported by ``export_index``.
+
+    All arrays are memory-mapped. ``mode="exact"`` scores every row with one
+    matrix-vector product; ``mode="ivf"`` scans only the ``nprobe`` closest
+    IVF lists, scoring their int8 codes and re-scoring the best
+    ``k * refine`` candidates against the float32 vectors. Distances follow
+    Chroma's conventions (squared L2, or 1 - similarity), so the relevance
+    score functions and ``as_retriever`` behave as they do with Chroma.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, embedding=None, mode="exact",
+                 nprobe=NPROBE, refine=REFINE):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if mode == "ivf" and not self.meta.get("nlist"):
+            raise ValueError(f"'{index_dir}' has no IVF layout; export it with ivf=True")
+        self.index_dir = index_dir
+        self.embedding = embedding
+        self.mode = mode
+        self.nprobe = nprobe
+        self.refine = refine
+        self.metric = self.meta["metric"]
+
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.vectors = load("vectors.npy")
+        self.sqnorms = load("sqnorms.npy")
+        self.docs = RecordTable(os.path.join(index_dir, "docs.jsonl"), load("doc_offsets.npy"))
+        if mode == "ivf":
+            self.centroids = np.load(os.path.join(index_dir, "ivf_centroids.npy"))
+            self.order = load("ivf_order.npy")
+            self.list_offsets = load("ivf_offsets.npy")
+            self.codes = load("ivf_codes.npy")
+            self.scales = load("ivf_scales.npy")
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def close(self):
+        """Unmap the snapshot files; the index can't be searched afterwards."""
+        self.__dict__.pop("docs").close()
+        for name in ("vectors", "sqnorms", "order", "list_offsets", "codes", "scales"):
+            self.__dict__.pop(name, None)
+
+    # ----- SCORING -----
+    def _prepare(self, vector):
+        q = np.asarray(vector, dtype=np.float32)
+        if self.metric == "cosine":
+            q = _normalize(q)
+        return q
+
+    def _score(self, dots, sqnorms):
+        # Higher is better for every metric
+        if self.metric == "l2":
+            return 2 * dots - sqnorms
+        return dots
+
+    def _distance(self, q, scores):
+        if self.metric == "l2":
+            return float(q @ q) - scores
+        return 1 - scores
+
+    def _top(self, scores, k):
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _search_exact(self, q, k):
+        scores = self._score(self.vectors @ q, self.sqnorms)
+        rows = self._top(scores, k)
+        return rows, scores[rows]
+
+    def _search_ivf(self, q, k):
+        lists = self._top(self.centroids @ _normalize(q), self.nprobe)
+        spans = [(int(self.list_offsets[l]), int(self.list_offsets[l + 1])) for l in lists]
+        positions = np.concatenate([np.arange(a, b) for a, b in spans]) if spans else np.empty(0, int)
+        if not len(positions):
+            return positions, np.empty(0, dtype=np.float32)
+
+        # Approximate scores from the int8 codes, then exact re-scoring of the best candidates
+        dots = np.concatenate([(self.codes[a:b] @ q) * self.scales[a:b] for a, b in spans])
+        rows = self.order[positions]
+        approx = self._score(dots, self.sqnorms[rows])
+        candidates = np.sort(rows[self._top(approx, k * self.refine)])
+        exact = self._score(self.vectors[candidates] @ q, self.sqnorms[candidates])
+        best = self._top(exact, k)
+        return candidates[best], exact[best]
+
+    def search_rows(self, vector, k=4):
+        """Row numbers and distances of the k nearest chunks to ``vector``."""
+        q = self._prepare(vector)
+        if self.mode == "ivf":
+            rows, scores = self._search_ivf(q, k)
+        else:
+            rows, scores = self._search_exact(q, k)
+        return rows, self._distance(q, scores)
+
+    def get_document(self, row):
+        record = self.docs[row]
+        return Document(page_content=record["page_content"], metadata=record["metadata"],
+                        id=record["id"])
+
+    # ----- VECTORSTORE API -----
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        rows, distances = self.search_rows(embedding, k)
+        return [(self.get_document(int(r)), float(d)) for r, d in zip(rows, distances)]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def search_by_vectors(self, vectors, k=4):
+        """Top-k documents for each of several query embeddings."""
+        return [self.similarity_search_by_vector(v, k) for v in vectors]
+
+    def _select_relevance_score_fn(self):
+        if self.metric == "cosine":
+            return self._cosine_relevance_score_fn
+        if self.metric == "ip":
+            return self._max_inner_product_relevance_score_fn
+        return self._euclidean_relevance_score_fn
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("NumpyVectorIndex is read-only; rebuild it with export_index()")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build the index from a Chroma store with export_index()")
+
+
+class SnapshotIndex(VectorStore):
+    """``NumpyVectorIndex`` over the current snapshot of ``index_root``.
+
+    Every search first checks the ``CURRENT`` pointer (one ``stat``) and
+    opens the new snapshot when it changed, so a running server follows
+    ``publish_snapshot`` without a restart. Each call works on a single
+    snapshot; searches in flight during a swap finish on the old one, which
+    is closed (unmapped) when the last of them returns. As the snapshot
+    files are memory-mapped read-only, all worker processes share one copy
+    of them in the page cache.
+    """
+
+    def __init__(self, index_root=INDEX_DIR, embedding=None, **options):
+        self.index_root = index_root
+        self.embedding = embedding
+        self.options = options
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.index = None
+        self._readers = {}  # index -> searches using it
+        self.current()
+
+    def _pointer_mtime(self):
+        try:
+            return os.stat(os.path.join(self.index_root, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _swap(self, mtime):
+        # Called with the lock held
+        old = self.index
+        self.index = NumpyVectorIndex(current_snapshot(self.index_root),
+                                      self.embedding, **self.options)
+        self._mtime = mtime
+        if old is not None and not self._readers.get(old):
+            old.close()
+
+    def current(self):
+        """The index of the published snapshot, reopened if it changed."""
+        mtime = self._pointer_mtime()
+        if self.index is None or mtime != self._mtime:
+            with self._lock:
+                if self.index is None or mtime != self._mtime:
+                    self._swap(mtime)
+        return self.index
+
+    @contextmanager
+    def _reading(self):
+        """The current index, kept open until the caller is done with it."""
+        mtime = self._pointer_mtime()
+        with self._lock:
+            if self.index is None or mtime != self._mtime:
+                self._swap(mtime)
+            index = self.index
+            self._readers[index] = self._readers.get(index, 0) + 1
+        try:
+            yield index
+        finally:
+            with self._lock:
+                self._readers[index] -= 1
+                if not self._readers[index]:
+                    del self._readers[index]
+                    if index is not self.index:
+                        index.close()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        with self._reading() as index:
+            return index.similarity_search_with_score_by_vector(embedding, k)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        with self._reading() as index:
+            return index.similarity_search_by_vector(embedding, k)
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        with self._reading() as index:
+            return index.similarity_search_with_score(query, k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        with self._reading() as index:
+            return index.similarity_search(query, k)
+
+    def search_by_vectors(self, vectors, k=4):
+        with self._reading() as index:
+            return index.search_by_vectors(vectors, k)
+
+    def _select_relevance_score_fn(self):
+        return self.current()._select_relevance_score_fn()
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Snapshots are read-only; publish a new one with publish_snapshot()")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build snapshots from a Chroma store with publish_snapshot()")
+
+
+if __name__ == "__main__":
+    from langchain_community.vectorstores import Chroma
+    from embeddings import PERSIST_DIR
+
+    parser = argparse.ArgumentParser(description="Publish the Chroma store as a NumPy index snapshot.")
+    parser.add_argument("--persist-dir", default=PERSIST_DIR)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--no-ivf", action="store_true", help="Skip the approximate IVF layout.")
+    args = parser.parse_args()
+    publish_snapshot(Chroma(persist_directory=args.persist_dir), args.index_dir, ivf=not args.no_ivf)